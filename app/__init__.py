@@ -1,11 +1,25 @@
 from flask import Flask
 
+from config import Config
 
-def create_app():
+
+def create_app(config_class=Config):
     app = Flask(__name__)
+    app.config.from_object(config_class)
+
+    from app import cache
+    from app import database
+    from app import metrics
 
+    database.init_app(app)
+    cache.init_app(app)
+    metrics.init_app(app)
+
+    from app.api import auth
     from app.api import bp as api_bp
 
+    auth.init_app(app)
+
     app.register_blueprint(api_bp, url_prefix="/api")
 
     return app
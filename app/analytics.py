@@ -0,0 +1,103 @@
+"""
+Vectorized time-series analytics over `columnar.CaseColumns`.
+
+Every function takes the columns and an optional boolean *mask* selecting the cases to
+include (see `CaseColumns.mask`), and works on whole arrays at once.
+"""
+
+import dataclasses
+import datetime as dt
+
+import numpy as np
+
+from app import columnar
+
+
+@dataclasses.dataclass
+class DailySeries:
+    """
+    Cases per day from *first* to the last day with cases, including days without cases.
+    """
+
+    first: dt.date
+    counts: np.ndarray
+
+    def dates(self) -> list[dt.date]:
+        return [self.first + dt.timedelta(days=i) for i in range(len(self.counts))]
+
+
+def _select(array: np.ndarray, mask: np.ndarray | None) -> np.ndarray:
+    return array if mask is None else array[mask]
+
+
+def daily_incidence(columns: columnar.CaseColumns, mask: np.ndarray | None = None) -> DailySeries | None:
+    """
+    Return the number of cases posted each day, or `None` if no selected case has a post
+    date.
+    """
+    days = _select(columns.post_date, mask)
+    days = days[days != columnar.NULL_DAY]
+    if not len(days):
+        return None
+    first = days.min()
+    return DailySeries(first=columnar.from_day(first), counts=np.bincount(days - first))
+
+
+def rolling_mean(counts: np.ndarray, window: int) -> np.ndarray:
+    """
+    Return the trailing *window*-day mean of daily *counts*. Days before the first full
+    window average over the days so far.
+    """
+    sums = np.cumsum(counts, dtype=np.int64)
+    sums[window:] = sums[window:] - sums[:-window]
+    return sums / np.minimum(np.arange(1, len(counts) + 1), window)
+
+
+def by_facility(columns: columnar.CaseColumns, mask: np.ndarray | None = None) -> dict[str | None, int]:
+    """
+    Return the number of cases per facility name, with `None` for cases without a
+    facility. Facilities without cases are left out.
+    """
+    codes = _select(columns.facility, mask).astype(np.int64)
+    counts = np.bincount(codes + 1, minlength=len(columns.dictionaries["facility"]) + 1)
+    names = [None] + columns.dictionaries["facility"]
+    return {names[i]: int(counts[i]) for i in np.flatnonzero(counts)}
+
+
+@dataclasses.dataclass
+class DelayDistribution:
+    """
+    Distribution of the days from test to post. *histogram*[d] is the number of cases
+    posted *d* days after their test.
+    """
+
+    count: int
+    mean: float | None
+    percentiles: dict[int, int]
+    histogram: np.ndarray
+
+
+def reporting_delay(
+    columns: columnar.CaseColumns, mask: np.ndarray | None = None, percentiles: tuple[int, ...] = (50, 90, 99)
+) -> DelayDistribution:
+    """
+    Return the distribution of the delay from test to post of the cases with both dates.
+    Negative delays, which come from misparsed dates, are left out.
+    """
+    test, post = _select(columns.test_date, mask), _select(columns.post_date, mask)
+    valid = (test != columnar.NULL_DAY) & (post != columnar.NULL_DAY)
+    delays = (post[valid] - test[valid]).astype(np.int64)
+    delays = delays[delays >= 0]
+    if not len(delays):
+        return DelayDistribution(count=0, mean=None, percentiles={}, histogram=np.zeros(0, dtype=np.int64))
+    # Delays are whole days, so percentiles are read off the cumulative histogram (nearest
+    # rank) instead of sorting the delays
+    histogram = np.bincount(delays)
+    cumulative = np.cumsum(histogram)
+    ranks = np.ceil(np.array(percentiles) / 100 * len(delays)).clip(min=1)
+    return DelayDistribution(
+        count=len(delays),
+        mean=float(delays.mean()),
+        percentiles={p: int(v) for p, v in zip(percentiles, np.searchsorted(cumulative, ranks))},
+        histogram=histogram,
+    )
@@ -2,4 +2,6 @@ from flask import Blueprint
 
 bp = Blueprint("api", __name__)
 
+from app.api import export
 from app.api import routes
+from app.api import tokens
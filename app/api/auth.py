@@ -1,15 +1,100 @@
 """Token authentication support."""
 
+import collections
+import datetime as dt
+import threading
+
+import flask
+import sqlalchemy as sa
 from flask_httpauth import HTTPTokenAuth
 
+import app.models as db
+from app.api.errors import error_response
+from app.database import get_ssn
+
 token_auth = HTTPTokenAuth()
 
 
+class TokenCache:
+    """
+    Bounded in-process LRU cache of verified tokens, mapping each token to the id of its
+    user. A cached token is dropped at its `APIToken.expiration`, or after *max_age*
+    seconds, whichever is first. *max_age* bounds how long a token revoked by another
+    process is still accepted by this one.
+
+    *max_size* is the maximum number of cached tokens.
+    """
+
+    def __init__(self, max_size: int = 1024, max_age: float = 60):
+        self.max_size = max_size
+        self.max_age = dt.timedelta(seconds=max_age)
+        self._entries: collections.OrderedDict[str, tuple[int, dt.datetime]] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> int | None:
+        """
+        Return the user id of *token*, or `None` if it is not cached or has expired.
+        """
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            user_id, expires = entry
+            if expires <= db.utcnow():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return user_id
+
+    def put(self, token: str, user_id: int, expiration: dt.datetime) -> None:
+        if self.max_size < 1:
+            return
+        with self._lock:
+            self._entries[token] = (user_id, min(expiration, db.utcnow() + self.max_age))
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, token: str) -> None:
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def get_token_cache() -> TokenCache:
+    return flask.current_app.extensions["token_cache"]
+
+
 @token_auth.verify_token
 def verify_token(token):
-    ...
+    """
+    Return the id of the user of *token*, or `None` if *token* is unknown or expired.
+    Tokens are looked up in the database only when they are not in the `TokenCache`.
+    """
+    if not token:
+        return None
+    cache = get_token_cache()
+    user_id = cache.get(token)
+    if user_id is None:
+        apitoken = (
+            get_ssn(readonly=True).scalars(sa.select(db.APIToken).where(db.APIToken.token == token)).one_or_none()
+        )
+        if apitoken is None or apitoken.expiration <= db.utcnow():
+            return None
+        user_id = apitoken.user_id
+        cache.put(token=token, user_id=user_id, expiration=apitoken.expiration)
+    return user_id
 
 
 @token_auth.error_handler
 def token_auth_error(status):
-    ...
+    return error_response(status)
+
+
+def init_app(app: flask.Flask) -> None:
+    app.extensions["token_cache"] = TokenCache(
+        max_size=app.config["TOKEN_CACHE_SIZE"], max_age=app.config["TOKEN_CACHE_MAX_AGE"]
+    )
@@ -0,0 +1,15 @@
+"""JSON error responses."""
+
+import flask
+from werkzeug.http import HTTP_STATUS_CODES
+
+
+def error_response(status_code: int, message: str | None = None) -> tuple[flask.Response, int]:
+    payload = {"error": HTTP_STATUS_CODES.get(status_code, "Unknown error")}
+    if message:
+        payload["message"] = message
+    return flask.jsonify(payload), status_code
+
+
+def bad_request(message: str) -> tuple[flask.Response, int]:
+    return error_response(400, message)
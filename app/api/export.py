@@ -0,0 +1,126 @@
+"""Streaming bulk export of cases."""
+
+import csv
+import io
+import json
+import typing as typ
+import zlib
+
+import flask
+import sqlalchemy as sa
+
+import app.models as db
+from app.api import bp
+from app.api.auth import token_auth
+from app.api.errors import bad_request
+from app.api.routes import filter_cases
+from app.cache import get_response_cache
+from app.database import get_ssn
+
+COLUMNS = ["id", "case_num", "facility", "building", "department", "last_work_date", "test_date", "post_date"]
+
+
+def export_stmt() -> sa.Select:
+    """
+    Return the query of all cases in id order, with facility, building and department by
+    name, as plain rows rather than ORM objects.
+    """
+    return (
+        sa.select(
+            db.CovidCase.id,
+            db.CovidCase.case_num,
+            db.Facility.name,
+            db.Building.name,
+            db.Department.name,
+            db.CovidCase.last_work_date,
+            db.CovidCase.test_date,
+            db.CovidCase.post_date,
+        )
+        .select_from(db.CovidCase)
+        .outerjoin(db.CovidCase._facility)
+        .outerjoin(db.CovidCase._building)
+        .outerjoin(db.CovidCase._department)
+        .order_by(db.CovidCase.id)
+    )
+
+
+def ndjson_chunk(rows: list[sa.Row]) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(COLUMNS, row)), default=lambda date: date.isoformat()) + "\n" for row in rows
+    ).encode()
+
+
+def csv_chunk(rows: list[sa.Row]) -> bytes:
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return buf.getvalue().encode()
+
+
+def iter_chunks(stmt: sa.Select, to_bytes: typ.Callable[[list[sa.Row]], bytes]) -> typ.Iterator[bytes]:
+    """
+    Yield the rows of *stmt* converted by *to_bytes*, one chunk of `EXPORT_CHUNK_SIZE` rows
+    at a time. Rows are fetched from a server-side cursor, so only one chunk is held in
+    memory.
+    """
+    stmt = stmt.execution_options(yield_per=flask.current_app.config["EXPORT_CHUNK_SIZE"])
+    for rows in get_ssn(readonly=True).execute(stmt).partitions():
+        yield to_bytes(rows)
+
+
+def gzipped(chunks: typ.Iterable[bytes]) -> typ.Iterator[bytes]:
+    """
+    Yield *chunks* compressed as one gzip stream.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(chunks: typ.Iterator[bytes], mimetype: str, filename: str) -> flask.Response:
+    """
+    Return a streaming response of *chunks*, gzipped if the client accepts it. The app
+    context, and with it the session, stays open until the last chunk is sent.
+    """
+    headers = {"Content-Disposition": f"attachment; filename={filename}", "Vary": "Accept-Encoding"}
+    if "gzip" in flask.request.accept_encodings:
+        chunks = gzipped(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return flask.Response(flask.stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+
+def export(mimetype: str, filename: str, to_bytes: typ.Callable[[list[sa.Row]], bytes], header: bytes = b""):
+    # Exports are not cached, but the generation check also refreshes the dimension names
+    # that `filter_cases` resolves
+    get_response_cache().check_generation()
+    try:
+        stmt = filter_cases(export_stmt())
+    except ValueError as e:
+        return bad_request(str(e))
+
+    def chunks():
+        yield header
+        if stmt is not None:
+            yield from iter_chunks(stmt, to_bytes)
+
+    return stream(chunks(), mimetype=mimetype, filename=filename)
+
+
+@bp.route("/export.ndjson")
+@token_auth.login_required
+def export_ndjson():
+    """
+    Stream all cases as newline-delimited JSON. Takes the filters of `/api/cases`.
+    """
+    return export("application/x-ndjson", "cases.ndjson", ndjson_chunk)
+
+
+@bp.route("/export.csv")
+@token_auth.login_required
+def export_csv():
+    """
+    Stream all cases as CSV with a header row. Takes the filters of `/api/cases`.
+    """
+    return export("text/csv", "cases.csv", csv_chunk, header=(",".join(COLUMNS) + "\r\n").encode())
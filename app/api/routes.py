@@ -1,6 +1,242 @@
+import collections
+import datetime as dt
+
+import flask
+import sqlalchemy as sa
+import sqlalchemy.orm as sa_orm
+
+import app.models as db
+from app import analytics
+from app import metrics
 from app.api import bp
+from app.api.auth import token_auth
+from app.api.errors import bad_request
+from app.cache import cached
+from app.database import get_case_columns
+from app.database import get_dimension_cache
+from app.database import get_ssn
 
 
 @bp.route("/hello")
 def index():
     return "Hello from the EB Covid Data API!"
+
+
+@bp.route("/metrics")
+def prometheus_metrics():
+    """
+    Return request, SQL and connection pool metrics in the Prometheus text format.
+    """
+    return flask.Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def encode_cursor(case: db.CovidCase) -> str:
+    """
+    Return the cursor pointing after *case*, e.g. `2021-10-04_1234`.
+    """
+    return f"{case.post_date.isoformat()}_{case.id}"
+
+
+def decode_cursor(cursor: str) -> tuple[dt.date, int]:
+    """
+    Return the `(post_date, id)` of *cursor*. Raise `ValueError` if *cursor* is malformed.
+    """
+    date, _, id_ = cursor.partition("_")
+    return dt.date.fromisoformat(date), int(id_)
+
+
+def date_arg(name: str) -> dt.date | None:
+    """
+    Return query argument *name* as a date, or `None` if it is absent. Raise `ValueError`
+    if it is not an ISO date.
+    """
+    value = flask.request.args.get(name)
+    return dt.date.fromisoformat(value) if value else None
+
+
+def filter_cases(stmt: sa.Select) -> sa.Select | None:
+    """
+    Return *stmt* filtered on the facility, department, start and end query arguments
+    (see `cases`), or `None` if there is no facility or department of the given name.
+    Raise `ValueError` if start or end is not an ISO date.
+    """
+    start, end = date_arg("start"), date_arg("end")
+    dims = get_dimension_cache()
+    for arg, model, column in [
+        ("facility", db.Facility, db.CovidCase.facility_id),
+        ("department", db.Department, db.CovidCase.department_id),
+    ]:
+        name = flask.request.args.get(arg)
+        if name is not None:
+            id_ = dims.get(ssn=get_ssn(readonly=True), model=model, name=name)
+            if id_ is None:
+                return None
+            stmt = stmt.where(column == id_)
+    if start is not None:
+        stmt = stmt.where(db.CovidCase.post_date >= start)
+    if end is not None:
+        stmt = stmt.where(db.CovidCase.post_date <= end)
+    return stmt
+
+
+@bp.route("/cases")
+@token_auth.login_required
+@cached
+def cases():
+    """
+    Return cases newest first, one page at a time.
+
+    Query arguments:
+     * facility, department: only cases of the facility or department with this name
+     * start, end: only cases posted on or between these ISO dates
+     * limit: page size, up to `API_MAX_PAGE_SIZE`
+     * after: the `next` cursor of the previous page
+
+    Pages are seeked on `(post_date, id)` rather than offset, so every page costs the same
+    index range scan no matter how deep it is. Cases without a post date are not listed.
+    """
+    config = flask.current_app.config
+    try:
+        limit = min(int(flask.request.args.get("limit", config["API_PAGE_SIZE"])), config["API_MAX_PAGE_SIZE"])
+        after = flask.request.args.get("after")
+        after = decode_cursor(after) if after else None
+    except ValueError as e:
+        return bad_request(str(e))
+    if limit < 1:
+        return bad_request("limit must be positive")
+
+    stmt = (
+        sa.select(db.CovidCase)
+        .options(
+            sa_orm.joinedload(db.CovidCase._facility),
+            sa_orm.joinedload(db.CovidCase._building),
+            sa_orm.joinedload(db.CovidCase._department),
+        )
+        .where(db.CovidCase.post_date.is_not(None))
+        .order_by(db.CovidCase.post_date.desc(), db.CovidCase.id.desc())
+        .limit(limit + 1)
+    )
+    try:
+        stmt = filter_cases(stmt)
+    except ValueError as e:
+        return bad_request(str(e))
+    if stmt is None:
+        return flask.jsonify({"cases": [], "next": None})
+    if after is not None:
+        stmt = stmt.where(sa.tuple_(db.CovidCase.post_date, db.CovidCase.id) < after)
+
+    rows = get_ssn(readonly=True).scalars(stmt).all()
+    page = rows[:limit]
+    return flask.jsonify(
+        {
+            "cases": [case.to_dict() for case in page],
+            "next": encode_cursor(page[-1]) if len(rows) > limit else None,
+        }
+    )
+
+
+@bp.route("/stats")
+@token_auth.login_required
+@cached
+def stats():
+    """
+    Return daily case counts with cumulative and rolling totals, read from `DailyCount`.
+
+    Query arguments:
+     * facility, building, department: counts of the facility, building or department with
+       this name (at most one), rather than the total
+     * start, end: only days between these ISO dates
+     * window: number of days of the rolling total
+
+    Only days with cases are listed.
+    """
+    try:
+        start, end = date_arg("start"), date_arg("end")
+        window = int(flask.request.args.get("window", flask.current_app.config["STATS_ROLLING_DAYS"]))
+    except ValueError as e:
+        return bad_request(str(e))
+    if window < 1:
+        return bad_request("window must be positive")
+    dimensions = [arg for arg in ["facility", "building", "department"] if arg in flask.request.args]
+    if len(dimensions) > 1:
+        return bad_request("at most one of facility, building and department may be given")
+
+    ssn = get_ssn(readonly=True)
+    dimension, dimension_id, name = "total", 0, None
+    if dimensions:
+        dimension = dimensions[0]
+        name = flask.request.args[dimension]
+        model = {"facility": db.Facility, "building": db.Building, "department": db.Department}[dimension]
+        dimension_id = get_dimension_cache().get(ssn=ssn, model=model, name=name)
+    series = [] if dimension_id is None else db.DailyCount.series(ssn, dimension, dimension_id, end=end)
+
+    # Cumulative and rolling totals are taken over the whole series, and only then cut to
+    # *start*, so that they do not restart at *start*
+    days = []
+    cumulative = rolling = 0
+    recent = collections.deque()
+    for date, count in series:
+        cumulative += count
+        rolling += count
+        recent.append((date, count))
+        while recent[0][0] <= date - dt.timedelta(days=window):
+            rolling -= recent.popleft()[1]
+        if start is None or date >= start:
+            days.append({"date": date.isoformat(), "cases": count, "cumulative": cumulative, "rolling": rolling})
+    return flask.jsonify({"dimension": dimension, "name": name, "window": window, "days": days})
+
+
+@bp.route("/analytics")
+@token_auth.login_required
+@cached
+def case_analytics():
+    """
+    Return daily incidence with 7- and 14-day rolling means, cases per facility, and the
+    distribution of days from test to post.
+
+    Query arguments:
+     * facility, building, department: only cases of the facility, building or department
+       with this name
+     * start, end: only cases posted on or between these ISO dates
+    """
+    try:
+        start, end = date_arg("start"), date_arg("end")
+    except ValueError as e:
+        return bad_request(str(e))
+    columns = get_case_columns()
+    mask = columns.mask(
+        facility=flask.request.args.get("facility"),
+        building=flask.request.args.get("building"),
+        department=flask.request.args.get("department"),
+        start=start,
+        end=end,
+    )
+
+    daily = []
+    series = analytics.daily_incidence(columns, mask)
+    if series is not None:
+        means = {window: analytics.rolling_mean(series.counts, window) for window in [7, 14]}
+        daily = [
+            {
+                "date": date.isoformat(),
+                "cases": int(count),
+                "mean_7": float(means[7][i]),
+                "mean_14": float(means[14][i]),
+            }
+            for i, (date, count) in enumerate(zip(series.dates(), series.counts))
+        ]
+    delay = analytics.reporting_delay(columns, mask)
+    return flask.jsonify(
+        {
+            "daily": daily,
+            "facilities": [
+                {"facility": name, "cases": count} for name, count in analytics.by_facility(columns, mask).items()
+            ],
+            "delay": {
+                "count": delay.count,
+                "mean": delay.mean,
+                **{f"p{p}": v for p, v in delay.percentiles.items()},
+                "histogram": delay.histogram.tolist(),
+            },
+        }
+    )
@@ -1,9 +1,73 @@
 """Token handling."""
 
+import datetime as dt
+import secrets
 
-def get_token():
-    ...
+import click
+import flask
+import sqlalchemy as sa
+import sqlalchemy.orm as sa_orm
 
+import app.models as db
+from app.api import bp
+from app.api.auth import get_token_cache
+from app.api.auth import token_auth
+from app.database import get_ssn
 
-def revoke_token():
-    ...
+# Tokens are hex encoded, so this is half the width of `APIToken.token`
+TOKEN_BYTES = 16
+
+# A token with less than this many seconds left is replaced rather than handed out again
+MIN_TOKEN_LIFE = 60
+
+
+def get_token(ssn: sa_orm.Session, user_id: int, expires_in: int = 3600) -> str:
+    """
+    Return a token of user *user_id*. The current token is returned if it is valid for at
+    least `MIN_TOKEN_LIFE` seconds. Otherwise a new token is issued that expires in
+    *expires_in* seconds. Commits.
+    """
+    now = db.utcnow()
+    apitoken = ssn.get(db.APIToken, user_id)
+    if apitoken is not None and apitoken.expiration > now + dt.timedelta(seconds=MIN_TOKEN_LIFE):
+        return apitoken.token
+    if apitoken is None:
+        apitoken = db.APIToken(user_id=user_id)
+        ssn.add(apitoken)
+    apitoken.token = secrets.token_hex(TOKEN_BYTES)
+    apitoken.expiration = now + dt.timedelta(seconds=expires_in)
+    ssn.commit()
+    return apitoken.token
+
+
+def revoke_token(ssn: sa_orm.Session, token: str) -> None:
+    """
+    Expire *token* and drop it from the app's `TokenCache`. Commits.
+    """
+    ssn.execute(
+        sa.update(db.APIToken)
+        .where(db.APIToken.token == token)
+        .values(expiration=db.utcnow() - dt.timedelta(seconds=1))
+    )
+    ssn.commit()
+    get_token_cache().discard(token)
+
+
+@bp.route("/tokens", methods=["DELETE"])
+@token_auth.login_required
+def delete_token():
+    revoke_token(ssn=get_ssn(), token=token_auth.get_auth()["token"])
+    return "", 204
+
+
+@bp.cli.command("token")
+@click.argument("email")
+def issue_token(email):
+    """
+    Print an API token of the user with EMAIL.
+    """
+    ssn = get_ssn()
+    user = ssn.scalars(sa.select(db.User).where(db.User.email == email)).one_or_none()
+    if user is None:
+        raise click.ClickException(f"No user with email {email}")
+    click.echo(get_token(ssn=ssn, user_id=user.id, expires_in=flask.current_app.config["TOKEN_EXPIRES_IN"]))
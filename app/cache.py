@@ -0,0 +1,142 @@
+"""Response cache for the API."""
+
+import collections
+import dataclasses
+import datetime as dt
+import functools
+import hashlib
+import threading
+import time
+
+import flask
+
+import app.models as db
+import log
+from app.database import get_dimension_cache
+from app.database import get_ssn
+
+logger = log.logging.getLogger("EBCovid.cache")
+
+
+@dataclasses.dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    mimetype: str
+    etag: str
+    last_modified: dt.datetime | None
+
+    def to_response(self) -> flask.Response:
+        """
+        Return a new response with the cached body, answering `304 Not Modified` if the
+        request's `If-None-Match` or `If-Modified-Since` match.
+        """
+        response = flask.Response(self.body, mimetype=self.mimetype)
+        response.set_etag(self.etag)
+        response.last_modified = self.last_modified
+        return response.make_conditional(flask.request)
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of successful API responses, keyed by path and query string.
+
+    The data only changes when `scripts/ingest.py` commits cases, which adds an
+    `IngestRun`. The id of the latest run is the generation of the data, and entries of an
+    older generation are discarded. The generation is read from the database at most once
+    every *check_interval* seconds, so between ingests a cache hit costs no queries.
+
+    *max_size* is the maximum number of cached responses.
+    """
+
+    def __init__(self, max_size: int = 256, check_interval: float = 10):
+        self.max_size = max_size
+        self.check_interval = check_interval
+        self._entries: collections.OrderedDict[str, CachedResponse] = collections.OrderedDict()
+        self._generation: int | None = None
+        self._last_modified: dt.datetime | None = None
+        self._checked = -float("inf")
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def check_generation(self) -> None:
+        """
+        Read the latest `IngestRun`, if not done within *check_interval* seconds, and
+        clear the cache if there has been an ingest since. The app's `DimensionCache` is
+        cleared, too, so that names added by the ingest resolve.
+        """
+        if time.monotonic() - self._checked < self.check_interval:
+            return
+        latest = db.IngestRun.latest(get_ssn(readonly=True))
+        generation = latest.id if latest else None
+        with self._lock:
+            self._checked = time.monotonic()
+            if generation != self._generation:
+                logger.info(f"Ingest generation {self._generation} -> {generation}, clearing response cache")
+                self._entries.clear()
+                get_dimension_cache().clear()
+                self._generation = generation
+                # `createdon` is naive server time, taken to be UTC
+                created = latest.createdon if latest else None
+                self._last_modified = created.replace(tzinfo=dt.timezone.utc) if created else None
+
+    def get(self, key: str) -> CachedResponse | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, response: flask.Response) -> CachedResponse:
+        """
+        Cache the body of *response* under *key*, evicting the least recently used entry
+        if the cache is full. Return the cache entry.
+        """
+        body = response.get_data()
+        entry = CachedResponse(
+            body=body,
+            mimetype=response.mimetype,
+            etag=f"{self._generation}-{hashlib.sha1(body).hexdigest()}",
+            last_modified=self._last_modified,
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+
+def get_response_cache() -> ResponseCache:
+    return flask.current_app.extensions["response_cache"]
+
+
+def cached(view):
+    """
+    Decorator serving the `200` responses of *view* from the app's `ResponseCache`, with
+    `ETag` and `Last-Modified` so that clients can revalidate with `304`. Other responses
+    are not cached.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        cache = get_response_cache()
+        cache.check_generation()
+        key = flask.request.full_path
+        entry = cache.get(key)
+        if entry is None:
+            response = flask.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            entry = cache.put(key, response)
+        return entry.to_response()
+
+    return wrapper
+
+
+def init_app(app: flask.Flask) -> None:
+    app.extensions["response_cache"] = ResponseCache(
+        max_size=app.config["RESPONSE_CACHE_SIZE"], check_interval=app.config["RESPONSE_CACHE_CHECK_INTERVAL"]
+    )
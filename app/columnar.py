@@ -0,0 +1,231 @@
+"""
+Compact columnar file of cases for offline analysis.
+
+The file is an 8-byte magic string, the length of a JSON header as a little-endian
+`uint32`, the header, and then one little-endian array per column, each aligned to 64
+bytes. Dates are `int32` days since 1970-01-01, with `NULL_DAY` for missing dates.
+Facility, building and department are `int16` codes into side tables of names stored in
+the header, with `NULL_CODE` for missing values.
+
+`load` memory-maps the file and returns views into the mapping, so nothing is copied or
+parsed beyond the header.
+"""
+
+import dataclasses
+import datetime as dt
+import json
+import pathlib
+import typing as typ
+
+import numpy as np
+import sqlalchemy as sa
+import sqlalchemy.orm as sa_orm
+
+import app.models as db
+import log
+
+logger = log.logging.getLogger("EBCovid.columnar")
+
+MAGIC = b"EBCASES1"
+ALIGN = 64
+
+EPOCH = dt.date(1970, 1, 1)
+NULL_DAY = np.iinfo(np.int32).min
+NULL_CODE = -1
+
+# Column name -> dtype, in file order
+COLUMNS = {
+    "id": "<i4",
+    "facility": "<i2",
+    "building": "<i2",
+    "department": "<i2",
+    "last_work_date": "<i4",
+    "test_date": "<i4",
+    "post_date": "<i4",
+}
+
+# Dictionary-encoded column -> dimension model and `CovidCase` foreign key
+DIMENSIONS = {
+    "facility": (db.Facility, db.CovidCase.facility_id),
+    "building": (db.Building, db.CovidCase.building_id),
+    "department": (db.Department, db.CovidCase.department_id),
+}
+
+DATES = ["last_work_date", "test_date", "post_date"]
+
+
+def to_day(date: dt.date | None) -> int:
+    """
+    Return *date* as days since `EPOCH`, or `NULL_DAY` if *date* is `None`.
+    """
+    return NULL_DAY if date is None else (date - EPOCH).days
+
+
+def from_day(day: int) -> dt.date | None:
+    return None if day == NULL_DAY else EPOCH + dt.timedelta(days=int(day))
+
+
+@dataclasses.dataclass
+class CaseColumns:
+    """
+    Cases as one NumPy array per column (see `COLUMNS`), plus the names of the facility,
+    building and department codes.
+    """
+
+    id: np.ndarray
+    facility: np.ndarray
+    building: np.ndarray
+    department: np.ndarray
+    last_work_date: np.ndarray
+    test_date: np.ndarray
+    post_date: np.ndarray
+    dictionaries: dict[str, list[str]]
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    def code(self, dimension: str, name: str) -> int | None:
+        """
+        Return the code of *name* in column *dimension*, or `None` if there is none.
+        """
+        try:
+            return self.dictionaries[dimension].index(name)
+        except ValueError:
+            return None
+
+    def mask(
+        self,
+        facility: str | None = None,
+        building: str | None = None,
+        department: str | None = None,
+        start: dt.date | None = None,
+        end: dt.date | None = None,
+    ) -> np.ndarray:
+        """
+        Return a boolean array selecting the cases of the named facility, building and
+        department, posted on or between *start* and *end*. `None` does not filter.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for dimension, name in [("facility", facility), ("building", building), ("department", department)]:
+            if name is not None:
+                code = self.code(dimension, name)
+                if code is None:
+                    return np.zeros(len(self), dtype=bool)
+                mask &= getattr(self, dimension) == code
+        # `NULL_DAY` sorts before every date, so missing post dates fail *start* but not *end*
+        if start is not None:
+            mask &= self.post_date >= to_day(start)
+        if end is not None:
+            mask &= (self.post_date <= to_day(end)) & (self.post_date != NULL_DAY)
+        return mask
+
+
+def encode(ids: np.ndarray, names: dict[int, str]) -> tuple[np.ndarray, list[str]]:
+    """
+    Dictionary-encode the dimension ids *ids*, in which -1 is `NULL`. Return the `int16`
+    codes and the names of the codes, looked up in *names*.
+    """
+    unique, codes = np.unique(ids, return_inverse=True)
+    if len(unique) and unique[0] == -1:
+        unique = unique[1:]
+        codes = codes - 1
+    if len(unique) > np.iinfo(np.int16).max:
+        raise ValueError(f"{len(unique)} distinct values do not fit in int16 codes")
+    return codes.astype(np.int16), [names[id_] for id_ in unique.tolist()]
+
+
+def from_db(ssn: sa_orm.Session, chunk_size: int = 10000) -> CaseColumns:
+    """
+    Read all cases from the database in id order. Rows are fetched *chunk_size* at a
+    time and converted to arrays chunk by chunk.
+    """
+    dims = list(DIMENSIONS)
+    stmt = (
+        sa.select(
+            db.CovidCase.id, *[column for _, column in DIMENSIONS.values()], *[getattr(db.CovidCase, c) for c in DATES]
+        )
+        .order_by(db.CovidCase.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    chunks = {name: [] for name in COLUMNS}
+    for rows in ssn.execute(stmt).partitions():
+        columns = list(zip(*rows))
+        chunks["id"].append(np.array(columns[0], dtype=np.int32))
+        for i, dimension in enumerate(dims, start=1):
+            chunks[dimension].append(np.array([-1 if v is None else v for v in columns[i]], dtype=np.int64))
+        for i, date in enumerate(DATES, start=1 + len(dims)):
+            chunks[date].append(np.array([to_day(v) for v in columns[i]], dtype=np.int32))
+
+    arrays = {name: np.concatenate(parts) if parts else np.empty(0, dtype=np.int64) for name, parts in chunks.items()}
+    dictionaries = {}
+    for dimension, (model, _) in DIMENSIONS.items():
+        names = dict(ssn.execute(sa.select(model.id, model.name)).all())
+        arrays[dimension], dictionaries[dimension] = encode(arrays[dimension], names)
+    return CaseColumns(
+        **{name: arrays[name].astype(dtype) for name, dtype in COLUMNS.items()}, dictionaries=dictionaries
+    )
+
+
+def _aligned(n: int) -> int:
+    return -(-n // ALIGN) * ALIGN
+
+
+def write(columns: CaseColumns, path: pathlib.Path | str) -> None:
+    """
+    Write *columns* to *path* in the columnar format.
+    """
+    offsets = {}
+    offset = 0
+    for name, dtype in COLUMNS.items():
+        offsets[name] = offset
+        offset = _aligned(offset + len(columns) * np.dtype(dtype).itemsize)
+    header = json.dumps(
+        {
+            "rows": len(columns),
+            "columns": {name: {"dtype": dtype, "offset": offsets[name]} for name, dtype in COLUMNS.items()},
+            "dictionaries": columns.dictionaries,
+        }
+    ).encode()
+    data_start = _aligned(len(MAGIC) + 4 + len(header))
+    with open(path, "wb") as f:
+        f.write(MAGIC + len(header).to_bytes(4, "little") + header)
+        for name, dtype in COLUMNS.items():
+            f.seek(data_start + offsets[name])
+            f.write(np.ascontiguousarray(getattr(columns, name), dtype=dtype).tobytes())
+        f.truncate(data_start + offset)
+
+
+def load(path: pathlib.Path | str) -> CaseColumns:
+    """
+    Memory-map the columnar file at *path*. The arrays are read-only views into the
+    mapping, so pages are only read from disk when they are used.
+    """
+    mapping = np.memmap(path, dtype=np.uint8, mode="r")
+    if bytes(mapping[: len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{path} is not a columnar case file")
+    header_len = int.from_bytes(bytes(mapping[len(MAGIC) : len(MAGIC) + 4]), "little")
+    header = json.loads(bytes(mapping[len(MAGIC) + 4 : len(MAGIC) + 4 + header_len]))
+    data_start = _aligned(len(MAGIC) + 4 + header_len)
+    arrays = {}
+    for name, spec in header["columns"].items():
+        start = data_start + spec["offset"]
+        dtype = np.dtype(spec["dtype"])
+        arrays[name] = mapping[start : start + header["rows"] * dtype.itemsize].view(dtype)
+    return CaseColumns(**arrays, dictionaries=header["dictionaries"])
+
+
+def rows(columns: CaseColumns, mask: np.ndarray | None = None) -> typ.Iterator[dict[str, typ.Any]]:
+    """
+    Yield the cases of *columns* selected by *mask* as `dict`s, decoded like
+    `db.CovidCase.to_dict`.
+    """
+    indices = np.flatnonzero(mask) if mask is not None else range(len(columns))
+    for i in indices:
+        case = {"id": int(columns.id[i])}
+        for dimension in DIMENSIONS:
+            code = int(getattr(columns, dimension)[i])
+            case[dimension] = None if code == NULL_CODE else columns.dictionaries[dimension][code]
+        for date in DATES:
+            day = from_day(getattr(columns, date)[i])
+            case[date] = day.isoformat() if day else None
+        yield case
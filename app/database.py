@@ -0,0 +1,65 @@
+"""Database access for request handlers."""
+
+import threading
+
+import flask
+import sqlalchemy.orm as sa_orm
+
+import app.models as db
+from app import columnar
+
+
+def get_ssn(readonly: bool = False) -> sa_orm.Session:
+    """
+    Return the `Session` of the current app context, opening it on first use. The session
+    is closed when the app context is torn down. If *readonly*, return a separate session
+    that may be bound to a read replica (see `db.ssn_from_dbenv`), which must not write.
+    """
+    key = "ro_ssn" if readonly else "ssn"
+    if key not in flask.g:
+        setattr(flask.g, key, db.ssn_from_dbenv(dbenv=flask.current_app.config["DBENV"], readonly=readonly))
+    return flask.g.get(key)
+
+
+def close_ssn(exc: BaseException | None = None) -> None:
+    for key in ["ssn", "ro_ssn"]:
+        ssn = flask.g.pop(key, None)
+        if ssn is not None:
+            ssn.close()
+
+
+def get_dimension_cache() -> db.DimensionCache:
+    """
+    Return the app-wide `DimensionCache`. It is shared by all requests, so request
+    handlers can resolve facility, building and department names without a query.
+    """
+    return flask.current_app.extensions["dimension_cache"]
+
+
+_case_columns_lock = threading.Lock()
+
+
+def get_case_columns() -> columnar.CaseColumns:
+    """
+    Return all cases in columnar form. If `COLUMNAR_FILE` is set, that file is memory
+    mapped. Otherwise cases are read from the database, once per ingest run, and kept in
+    memory.
+    """
+    path = flask.current_app.config["COLUMNAR_FILE"]
+    if path:
+        return columnar.load(path)
+    latest = db.IngestRun.latest(get_ssn(readonly=True))
+    generation = latest.id if latest else None
+    with _case_columns_lock:
+        cached = flask.current_app.extensions.get("case_columns")
+        if cached is None or cached[0] != generation:
+            cached = flask.current_app.extensions["case_columns"] = (
+                generation,
+                columnar.from_db(get_ssn(readonly=True)),
+            )
+    return cached[1]
+
+
+def init_app(app: flask.Flask) -> None:
+    app.extensions["dimension_cache"] = db.DimensionCache(max_age=app.config["DIMENSION_CACHE_MAX_AGE"])
+    app.teardown_appcontext(close_ssn)
@@ -0,0 +1,153 @@
+"""
+Request and database metrics of the API, exposed in the Prometheus text format.
+
+Metrics are kept in process memory, so each worker process reports its own.
+"""
+
+import bisect
+import threading
+import time
+
+import flask
+import sqlalchemy as sa
+
+import app.models as db
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Upper bounds of the buckets of SQL statements per request
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+class Histogram:
+    """
+    Prometheus histogram with labels *labelnames*. Observing is a bucket search and a few
+    additions under a lock.
+    """
+
+    def __init__(
+        self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: dict[tuple[str, ...], list] = {}  # labels -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            if i < len(self.buckets):
+                series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), total, n) for labels, (counts, total, n) in self._series.items()}
+        for labels, (counts, total, n) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _labels(self.labelnames + ("le",), labels + (repr(float(bound)),))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + ('+Inf',))} {n}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {n}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "ebcovid_request_duration_seconds", "Time to handle an API request.", ("route", "method", "status")
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    "ebcovid_request_sql_statements", "SQL statements executed per API request.", ("route",), buckets=COUNT_BUCKETS
+)
+REQUEST_SQL_SECONDS = Histogram(
+    "ebcovid_request_sql_duration_seconds", "Time spent executing SQL per API request.", ("route",)
+)
+POOL_CHECKOUT_SECONDS = Histogram(
+    "ebcovid_db_pool_checkout_seconds", "Time to check a connection out of the pool, including waits.", ("dbenv",)
+)
+
+HISTOGRAMS = [REQUEST_SECONDS, REQUEST_SQL_STATEMENTS, REQUEST_SQL_SECONDS, POOL_CHECKOUT_SECONDS]
+
+
+def render_pools() -> list[str]:
+    name = "ebcovid_db_pool_connections"
+    lines = [f"# HELP {name} Connections of the pool by state.", f"# TYPE {name} gauge"]
+    for dbenv, engine in sorted(db.engines.created().items()):
+        pool = engine.pool
+        if isinstance(pool, sa.pool.QueuePool):
+            for state, value in [("checked_out", pool.checkedout()), ("idle", pool.checkedin())]:
+                lines.append(f"{name}{_labels(('dbenv', 'state'), (dbenv, state))} {value}")
+    return lines
+
+
+def render() -> str:
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    lines.extend(render_pools())
+    return "\n".join(lines) + "\n"
+
+
+# The start time of a statement is kept on its execution context, which is discarded with
+# the statement, so a statement that raises leaves nothing behind on the connection
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and flask.has_app_context() and "sql_seconds" in flask.g:
+        context.metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "metrics_start", None)
+    if start is not None and flask.has_app_context() and "sql_seconds" in flask.g:
+        flask.g.sql_seconds += time.perf_counter() - start
+        flask.g.sql_statements += 1
+
+
+def _start_request() -> None:
+    flask.g.request_start = time.perf_counter()
+    flask.g.sql_seconds = 0.0
+    flask.g.sql_statements = 0
+
+
+def _end_request(response: flask.Response) -> flask.Response:
+    if "request_start" in flask.g:
+        rule = flask.request.url_rule
+        route = rule.rule if rule is not None else "unmatched"
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - flask.g.request_start, route, flask.request.method, str(response.status_code)
+        )
+        REQUEST_SQL_STATEMENTS.observe(flask.g.sql_statements, route)
+        REQUEST_SQL_SECONDS.observe(flask.g.sql_seconds, route)
+    return response
+
+
+_engine_events_lock = threading.Lock()
+
+
+def init_app(app: flask.Flask) -> None:
+    with _engine_events_lock:
+        if not sa.event.contains(sa.Engine, "before_cursor_execute", _before_cursor_execute):
+            sa.event.listen(sa.Engine, "before_cursor_execute", _before_cursor_execute)
+            sa.event.listen(sa.Engine, "after_cursor_execute", _after_cursor_execute)
+            db.TimedQueuePool.on_checkout.append(lambda dbenv, seconds: POOL_CHECKOUT_SECONDS.observe(seconds, dbenv))
+    app.before_request(_start_request)
+    app.after_request(_end_request)
@@ -1,12 +1,22 @@
+import datetime as dt
+import difflib
+import hashlib
+import os
+import re
+import threading
+import time
 import typing as typ
 
 import sqlalchemy as sa
+import sqlalchemy.dialects.postgresql as sa_pg
+import sqlalchemy.dialects.sqlite as sa_sqlite
 import sqlalchemy.exc as sa_exc
 import sqlalchemy.ext.declarative as sa_ext_decl
 import sqlalchemy.inspection as sa_inspect
 import sqlalchemy.orm as sa_orm
 
 import log
+from app import seed
 from config import Config
 
 logger = log.logging.getLogger("EBCovid.models")
@@ -14,6 +24,10 @@ logger = log.logging.getLogger("EBCovid.models")
 SHORT_STR = 100
 LONG_STR = 500
 
+# Rows per `INSERT` statement in `DeclBase.insert_many`. Keeps the number of bound
+# parameters well below the limits of the DBAPI drivers.
+INSERT_BATCH_SIZE = 500
+
 convention = {
     "ix": "ix_%(column_0_label)s",
     "uq": "uq_%(table_name)s_%(column_0_name)s",
@@ -32,26 +46,48 @@ class DeclBase:
         return cls.__name__
 
     @classmethod
-    def one_or_create(cls: "DeclBase", ssn: sa_orm.Session, **kwargs) -> "DeclBase":
+    def one_or_create(
+        cls: "DeclBase", ssn: sa_orm.Session, defaults: dict[str, typ.Any] | None = None, **kwargs
+    ) -> "DeclBase":
         """
         Query for *cls* by *kwargs*. If a record is found, return the record. If no
-        records are found, attempts to commit a new record with *kwargs* and return the
-        new record. Records that violate any constraints are not committed.
+        records are found, attempts to commit a new record with *kwargs* and *defaults* and
+        return the new record. Records that violate any constraints are not committed.
         """
         row = ssn.query(cls).filter_by(**kwargs).one_or_none()
         if row is None:
-            row = cls(**kwargs)
+            row = cls(**kwargs, **(defaults or {}))
             ssn.add(row)
             try:
                 ssn.commit()
-                logger.debug(f"Created {row}")
+                logger.debug("Created %s", row)
             except sa_exc.SQLAlchemyError:
                 ssn.rollback()
-                logger.warning(f"Cannot commit {row}")
+                logger.warning("Cannot commit %s", row)
         else:
-            logger.debug(f"Found {row}")
+            logger.debug("Found %s", row)
         return row
 
+    @classmethod
+    def insert_many(cls: "DeclBase", ssn: sa_orm.Session, rows: list[dict[str, typ.Any]]) -> list[int]:
+        """
+        Insert *rows* into *cls* using `INSERT ... ON CONFLICT DO NOTHING ... RETURNING` in
+        batches of `INSERT_BATCH_SIZE`. Rows that violate a unique constraint are skipped.
+        Return the primary keys of the inserted rows. Does not commit.
+        """
+        pk = sa_inspect.inspect(cls).primary_key[0]
+        dialect_insert = _dialect_insert_map[ssn.get_bind().dialect.name]
+        inserted = []
+        for i in range(0, len(rows), INSERT_BATCH_SIZE):
+            stmt = (
+                dialect_insert(cls.__table__)
+                .values(rows[i : i + INSERT_BATCH_SIZE])
+                .on_conflict_do_nothing()
+                .returning(pk)
+            )
+            inserted.extend(ssn.scalars(stmt))
+        return inserted
+
     @classmethod
     def pk_column_name(cls: "DeclBase") -> str:
         """
@@ -70,23 +106,240 @@ class DeclBase:
         return f"<{classname} {column_kvs}>"
 
 
-Engine_dev = sa.create_engine(url=Config.DB_URI_DEV, pool_pre_ping=True)
-Session_dev = sa_orm.sessionmaker(bind=Engine_dev)
+_dialect_insert_map = {"postgresql": sa_pg.insert, "sqlite": sa_sqlite.insert}
+
+
+class TimedQueuePool(sa.pool.QueuePool):
+    """
+    `QueuePool` that reports how long each checkout took, including any wait for a free
+    connection, to the callbacks in `on_checkout`. *dbenv* names the pool in reports.
+    """
+
+    on_checkout: list[typ.Callable[[str | None, float], None]] = []
+
+    dbenv: str | None = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            seconds = time.perf_counter() - start
+            for callback in self.on_checkout:
+                callback(self.dbenv, seconds)
+
+    def recreate(self) -> "TimedQueuePool":
+        pool = super().recreate()
+        pool.dbenv = self.dbenv
+        return pool
+
+
+def engine_options(url: str) -> dict[str, typ.Any]:
+    """
+    Return the `sa.create_engine` keyword arguments for *url*, from the `DB_*` settings of
+    `Config`.
+    """
+    options = {"pool_pre_ping": True}
+    if Config.DB_POOL == "null":
+        # Every checkout opens a new connection, for use behind an external pooler such as
+        # PgBouncer that all workers share
+        options["poolclass"] = sa.pool.NullPool
+    else:
+        options.update(
+            poolclass=TimedQueuePool,
+            pool_size=Config.DB_POOL_SIZE,
+            max_overflow=Config.DB_MAX_OVERFLOW,
+            pool_recycle=Config.DB_POOL_RECYCLE,
+            pool_timeout=Config.DB_POOL_TIMEOUT,
+        )
+    if Config.DB_STATEMENT_TIMEOUT and sa.engine.make_url(url).get_backend_name() == "postgresql":
+        options["connect_args"] = {"options": f"-c statement_timeout={Config.DB_STATEMENT_TIMEOUT}"}
+    return options
+
+
+def _setup_sqlite(engine: sa.Engine) -> None:
+    """
+    Set `Config.SQLITE_PRAGMAS` on every connection of *engine*, and create the database
+    file and its tables from `Metadata` if they do not exist. An empty database is seeded
+    with the reference rows of `app.seed`, like one upgraded by the migrations.
+    """
+
+    @sa.event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        for pragma, value in Config.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+        cursor.close()
+
+    path = engine.url.database
+    if path and path != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    Metadata.create_all(engine)
+    with engine.begin() as conn:
+        if not conn.scalar(sa.select(sa.func.count()).select_from(Facility.__table__)):
+            conn.execute(sa.insert(Facility), [{"id": id_, "name": name} for id_, name in seed.FACILITIES])
+            conn.execute(
+                sa.insert(RawFacility),
+                [
+                    {"id": id_, "name": name, "facility_id": facility_id}
+                    for id_, name, facility_id in seed.RAW_FACILITIES
+                ],
+            )
+
+
+# Suffix of the registry key of the read replica of a dbenv
+REPLICA = ":replica"
+
+# Database environments of the `Config` URIs
+DBENVS = ["dev", "test", "prod", "local"]
+
+
+class EngineRegistry:
+    """
+    Lazy registry of the engine of each dbenv. Registering a dbenv only records its URL;
+    the engine and its connection pool are created when a session is first asked for.
+    SQLite databases are also created then (see `_setup_sqlite`).
+
+    A dbenv may have a read replica. Sessions of the primary record when they commit
+    writes, so that reads can stick to the primary until the replica has caught up (see
+    `use_replica`).
+    """
+
+    def __init__(self):
+        self._urls: dict[str, str] = {}
+        self._engines: dict[str, sa.Engine] = {}
+        self._sessionmakers: dict[str, sa_orm.sessionmaker] = {}
+        self._last_write: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def register(self, dbenv: str, url: str, replica_url: str | None = None) -> None:
+        """
+        Make *dbenv* refer to the database at *url*, and its reads to the replica at
+        *replica_url* if given, replacing any engines it had.
+        """
+        urls = {dbenv: url, dbenv + REPLICA: replica_url}
+        engines = []
+        with self._lock:
+            for key, url_ in urls.items():
+                if url_ is None:
+                    self._urls.pop(key, None)
+                else:
+                    self._urls[key] = url_
+                engines.append(self._engines.pop(key, None))
+                self._sessionmakers.pop(key, None)
+        for engine in engines:
+            if engine is not None:
+                engine.dispose()
+
+    def __contains__(self, dbenv: str) -> bool:
+        return dbenv in self._urls
+
+    def engine(self, dbenv: str) -> sa.Engine:
+        """
+        Return the engine of *dbenv*, creating it on first use.
+        """
+        engine = self._engines.get(dbenv)
+        if engine is None:
+            with self._lock:
+                engine = self._engines.get(dbenv)
+                if engine is None:
+                    url = self._urls[dbenv]
+                    engine = self._engines[dbenv] = sa.create_engine(url=url, **engine_options(url))
+                    engine.pool.dbenv = dbenv
+                    if engine.url.get_backend_name() == "sqlite":
+                        _setup_sqlite(engine)
+                    logger.debug(f"Created engine for dbenv '{dbenv}'")
+        return engine
+
+    def sessionmaker(self, dbenv: str) -> sa_orm.sessionmaker:
+        sessionmaker = self._sessionmakers.get(dbenv)
+        if sessionmaker is None:
+            sessionmaker = sa_orm.sessionmaker(bind=self.engine(dbenv))
+            if not dbenv.endswith(REPLICA):
+                self._track_writes(dbenv, sessionmaker)
+            self._sessionmakers[dbenv] = sessionmaker
+        return sessionmaker
+
+    def _track_writes(self, dbenv: str, sessionmaker: sa_orm.sessionmaker) -> None:
+        def mark(ssn, *args):
+            ssn.info["wrote"] = True
+
+        def on_execute(state):
+            if state.is_insert or state.is_update or state.is_delete:
+                mark(state.session)
+
+        def on_commit(ssn):
+            if ssn.info.pop("wrote", False):
+                self._last_write[dbenv] = time.monotonic()
+
+        sa.event.listen(sessionmaker, "after_flush", mark)
+        sa.event.listen(sessionmaker, "do_orm_execute", on_execute)
+        sa.event.listen(sessionmaker, "after_commit", on_commit)
+
+    def use_replica(self, dbenv: str) -> bool:
+        """
+        Return whether reads of *dbenv* may go to its replica: it has one, and this process
+        has not committed writes to the primary in the last `Config.REPLICA_STICKY_SECONDS`.
+        """
+        if dbenv + REPLICA not in self._urls:
+            return False
+        last_write = self._last_write.get(dbenv)
+        return last_write is None or time.monotonic() - last_write >= Config.REPLICA_STICKY_SECONDS
+
+    def created(self) -> dict[str, sa.Engine]:
+        """
+        Return the engines created so far by dbenv.
+        """
+        return dict(self._engines)
+
+    def dispose(self, close: bool = True) -> None:
+        """
+        Dispose of the pools of all created engines. With *close* `False` the pooled
+        connections are dropped without being closed, which is what a forked child must
+        do with the connections of its parent.
+        """
+        for engine in list(self._engines.values()):
+            engine.dispose(close=close)
+
+
+engines = EngineRegistry()
+engines.register("dev", Config.DB_URI_DEV, replica_url=Config.DB_URI_REPLICA_DEV)
+engines.register("test", Config.DB_URI_TEST, replica_url=Config.DB_URI_REPLICA_TEST)
+engines.register("prod", Config.DB_URI_PROD, replica_url=Config.DB_URI_REPLICA_PROD)
+engines.register("local", Config.DB_URI_LOCAL)
+
+# Worker processes forked from a parent that already used the database (e.g. gunicorn
+# --preload) must not share its connections, but start their own pools
+os.register_at_fork(after_in_child=lambda: engines.dispose(close=False))
 
-Engine_test = sa.create_engine(url=Config.DB_URI_TEST, pool_pre_ping=True)
-Session_test = sa_orm.sessionmaker(bind=Engine_dev)
 
-Engine_prod = sa.create_engine(url=Config.DB_URI_PROD, pool_pre_ping=True)
-Session_prod = sa_orm.sessionmaker(bind=Engine_dev)
+def register_dbenv(dbenv: str, url: str, replica_url: str | None = None) -> None:
+    """
+    Make *dbenv* available to `ssn_from_dbenv`, backed by the database at *url* and
+    optionally the read replica at *replica_url*. Used for throwaway databases such as the
+    benchmark's SQLite file.
+    """
+    engines.register(dbenv=dbenv, url=url, replica_url=replica_url)
+
 
-_dbenv_session_map = {"dev": Session_dev, "test": Session_test, "prod": Session_prod}
+def ssn_from_dbenv(dbenv: str, readonly: bool = False) -> sa_orm.Session:
+    """
+    Return an open `Session` based on *dbenv* (dev, test, prod, local). If *readonly*, the
+    session is bound to the replica of *dbenv* when there is one and reads need not stick
+    to the primary (see `EngineRegistry.use_replica`). Never write with a *readonly*
+    session.
+    """
+    dbenv = dbenv if dbenv in engines else "dev"
+    if readonly and engines.use_replica(dbenv):
+        return engines.sessionmaker(dbenv + REPLICA)()
+    return engines.sessionmaker(dbenv)()
 
 
-def ssn_from_dbenv(dbenv: str) -> sa_orm.Session:
+def utcnow() -> dt.datetime:
     """
-    Return an open `Session` based on *dbenv* (dev, test, prod).
+    Return the current UTC time as a naive `datetime`, comparable with `DateTime` columns.
     """
-    return _dbenv_session_map.get(dbenv, Session_dev)()
+    return dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)
 
 
 @sa_orm.declarative_mixin
@@ -109,6 +362,20 @@ class IDNameMixin(IDMixin):
 
     name = sa.Column(sa.String(SHORT_STR), nullable=False)
 
+    @classmethod
+    def ids_by_name(cls, ssn: sa_orm.Session, names: typ.Iterable[str | None]) -> dict[str, int]:
+        """
+        Return a `dict` mapping each of *names* to the primary key of its record. Names
+        without a record are inserted first. Uses one `INSERT` and one `SELECT` regardless of
+        the number of names. `None` is discarded. Does not commit.
+        """
+        names = set(names)
+        names.discard(None)
+        if not names:
+            return {}
+        cls.insert_many(ssn=ssn, rows=[{"name": name} for name in sorted(names)])
+        return dict(ssn.execute(sa.select(cls.name, cls.id).where(cls.name.in_(names))).all())
+
 
 @sa_orm.declarative_mixin
 class CreatedOnMixin:
@@ -152,6 +419,7 @@ class Password(DeclBase):
 
 class APIToken(DeclBase, CreatedOnMixin):
     # Table args
+    __table_args__ = (sa.UniqueConstraint("token"),)
 
     # Columns
     user_id = sa.Column(sa.Integer(), sa.ForeignKey("User.id"), primary_key=True, nullable=False)
@@ -168,15 +436,32 @@ class APIToken(DeclBase, CreatedOnMixin):
 
 class Facility(DeclBase, IDNameMixin):
     # Table args
-    __tableargs__ = sa.UniqueConstraint("name")
+    __table_args__ = (sa.UniqueConstraint("name"),)
 
     # Relationships
     _covidcases = sa_orm.relationship("CovidCase", back_populates="_facility")
+    _rawfacilities = sa_orm.relationship("RawFacility", back_populates="_facility")
+
+
+class RawFacility(DeclBase, IDNameMixin):
+    """
+    A spelling of a facility as it appears in case reports, e.g. 'Groton facility', and
+    the `Facility` it refers to.
+    """
+
+    # Table args
+    __table_args__ = (sa.UniqueConstraint("name"),)
+
+    # Columns
+    facility_id = sa.Column(sa.Integer(), sa.ForeignKey("Facility.id"), nullable=False)
+
+    # Relationships
+    _facility = sa_orm.relationship("Facility", back_populates="_rawfacilities")
 
 
 class Building(DeclBase, IDNameMixin):
     # Table args
-    __tableargs__ = sa.UniqueConstraint("name")
+    __table_args__ = (sa.UniqueConstraint("name"),)
 
     # Relationships
     _covidcases = sa_orm.relationship("CovidCase", back_populates="_building")
@@ -184,16 +469,25 @@ class Building(DeclBase, IDNameMixin):
 
 class Department(DeclBase, IDNameMixin):
     # Table args
-    __tableargs__ = sa.UniqueConstraint("name")
+    __table_args__ = (sa.UniqueConstraint("name"),)
 
     # Relationships
     _covidcases = sa_orm.relationship("CovidCase", back_populates="_department")
 
 
 class CovidCase(DeclBase, IDMixin):
+    """
+    One reported case. *case_num* is the case number of the source, if it has one, and
+    *content_hash* the `hash_content` of the case, which identifies duplicates. The hash
+    covers *case_num*, so cases with the same fields but distinct numbers are both kept.
+    """
+
     # Table args
+    __table_args__ = (sa.UniqueConstraint("case_num"), sa.UniqueConstraint("content_hash"))
 
     # Columns
+    case_num = sa.Column(sa.Integer())
+    content_hash = sa.Column(sa.String(32), nullable=False)
     facility_id = sa.Column(sa.Integer(), sa.ForeignKey("Facility.id"))
     building_id = sa.Column(sa.Integer(), sa.ForeignKey("Building.id"))
     department_id = sa.Column(sa.Integer(), sa.ForeignKey("Department.id"))
@@ -205,3 +499,362 @@ class CovidCase(DeclBase, IDMixin):
     _facility = sa_orm.relationship("Facility", back_populates="_covidcases")
     _building = sa_orm.relationship("Building", back_populates="_covidcases")
     _department = sa_orm.relationship("Department", back_populates="_covidcases")
+
+    @staticmethod
+    def hash_content(
+        case_num: int | None,
+        facility_id: int | None,
+        building_id: int | None,
+        department_id: int | None,
+        last_work_date: dt.date | None,
+        test_date: dt.date | None,
+        post_date: dt.date | None,
+    ) -> str:
+        """
+        Return the MD5 hex digest of the `|`-separated fields, with NULLs as empty strings
+        and dates ISO formatted. Must match the backfill of migration 6c2e8f1b4d07.
+        """
+        fields = [case_num, facility_id, building_id, department_id, last_work_date, test_date, post_date]
+        content = "|".join("" if field is None else str(field) for field in fields)
+        return hashlib.md5(content.encode()).hexdigest()
+
+    @classmethod
+    def existing_case_nums(cls, ssn: sa_orm.Session, case_nums: list[int]) -> set[int]:
+        """
+        Return those of *case_nums* that are already stored. Ingest checks case numbers
+        explicitly, because CovidCase partitioned by post_date only has them unique per post
+        date (see migration 2b8f5e0a7c13).
+        """
+        return set(ssn.scalars(sa.select(cls.case_num).where(cls.case_num.in_(case_nums))))
+
+    @classmethod
+    def claim_unnumbered(cls, ssn: sa_orm.Session, rows: list[dict[str, typ.Any]]) -> set[int]:
+        """
+        Give the case numbers and content hashes of *rows* (column values of new cases) to
+        the stored cases without a case number that have the same fields. Such cases were
+        stored before case numbers were kept, and hashed without one by migration
+        6c2e8f1b4d07. Each stored case is claimed by at most one row. Return the case
+        numbers given. Does not commit.
+        """
+        claims = {}
+        for row in rows:
+            if row["case_num"] is not None:
+                fields = [row[key] for key in ["facility_id", "building_id", "department_id"]]
+                dates = [row[key] for key in ["last_work_date", "test_date", "post_date"]]
+                claims.setdefault(cls.hash_content(None, *fields, *dates), row)
+        if not claims:
+            return set()
+        stmt = sa.select(cls.id, cls.content_hash).where(cls.case_num.is_(None), cls.content_hash.in_(claims))
+        updates = [
+            {"id": id_, "case_num": claims[hash_]["case_num"], "content_hash": claims[hash_]["content_hash"]}
+            for id_, hash_ in ssn.execute(stmt)
+        ]
+        if updates:
+            ssn.execute(sa.update(cls), updates)
+            logger.info(f"Numbered {len(updates)} stored cases")
+        return {update["case_num"] for update in updates}
+
+    def to_dict(self) -> dict[str, typ.Any]:
+        """
+        Return the case as a JSON-serializable `dict`, with facility, building and
+        department by name. Dates are ISO formatted.
+        """
+
+        def isodate(date: dt.date | None) -> str | None:
+            return date.isoformat() if date else None
+
+        return {
+            "id": self.id,
+            "case_num": self.case_num,
+            "facility": self._facility.name if self._facility else None,
+            "building": self._building.name if self._building else None,
+            "department": self._department.name if self._department else None,
+            "last_work_date": isodate(self.last_work_date),
+            "test_date": isodate(self.test_date),
+            "post_date": isodate(self.post_date),
+        }
+
+
+# Seek index for paging through cases newest first (see `/api/cases`)
+sa.Index("ix_CovidCase_post_date_id", CovidCase.post_date, CovidCase.id)
+
+# Seek indexes for paging through the cases of a facility or department, and indexes for
+# filtering by test date and joining buildings. Migration 2b8f5e0a7c13 can also partition
+# the table by post_date on PostgreSQL, which these models do not describe.
+sa.Index("ix_CovidCase_facility_id_post_date_id", CovidCase.facility_id, CovidCase.post_date, CovidCase.id)
+sa.Index("ix_CovidCase_department_id_post_date_id", CovidCase.department_id, CovidCase.post_date, CovidCase.id)
+sa.Index("ix_CovidCase_building_id", CovidCase.building_id)
+sa.Index("ix_CovidCase_test_date", CovidCase.test_date)
+
+
+#
+#
+
+
+class IngestRun(DeclBase, IDMixin, CreatedOnMixin):
+    """
+    One row per ingest run that committed cases. The latest row is the high-water mark
+    used by incremental ingest.
+    """
+
+    # Table args
+
+    # Columns
+    case_num = sa.Column(sa.Integer())
+    post_date = sa.Column(sa.Date())
+
+    @classmethod
+    def latest(cls: "IngestRun", ssn: sa_orm.Session) -> "IngestRun | None":
+        """
+        Return the most recent run, or `None` if nothing has been ingested yet.
+        """
+        return ssn.scalars(sa.select(cls).order_by(cls.id.desc()).limit(1)).first()
+
+
+class DailyCount(DeclBase, IDMixin):
+    """
+    Number of cases posted per day, in total and per facility, building and department.
+    Maintained incrementally by `refresh` so that dashboards never aggregate `CovidCase`.
+
+    *dimension* is one of the keys of `DIMENSIONS`. *dimension_id* is the id of the
+    facility, building or department, or 0 for the total and for cases without one.
+    """
+
+    # Table args
+    __table_args__ = (sa.UniqueConstraint("dimension", "dimension_id", "post_date"),)
+
+    # Columns
+    dimension = sa.Column(sa.String(SHORT_STR), nullable=False)
+    dimension_id = sa.Column(sa.Integer(), nullable=False)
+    post_date = sa.Column(sa.Date(), nullable=False)
+    case_count = sa.Column(sa.Integer(), nullable=False)
+
+    DIMENSIONS = {
+        "total": None,
+        "facility": CovidCase.facility_id,
+        "building": CovidCase.building_id,
+        "department": CovidCase.department_id,
+    }
+
+    @classmethod
+    def refresh(cls: "DailyCount", ssn: sa_orm.Session, dates: typ.Iterable[dt.date | None]) -> None:
+        """
+        Recount the cases posted on *dates*, replacing their rows. Only cases posted on
+        *dates* are read, so the cost depends on the dates touched by an ingest, not on
+        the size of `CovidCase`. Does not commit.
+        """
+        dates = set(dates)
+        dates.discard(None)
+        if not dates:
+            return
+        ssn.execute(sa.delete(cls).where(cls.post_date.in_(dates)))
+        for dimension, column in cls.DIMENSIONS.items():
+            key = [] if column is None else [sa.func.coalesce(column, 0)]
+            select = (
+                sa.select(CovidCase.post_date, sa.literal(dimension), *(key or [sa.literal(0)]), sa.func.count())
+                .where(CovidCase.post_date.in_(dates))
+                .group_by(CovidCase.post_date, *key)
+            )
+            ssn.execute(sa.insert(cls).from_select(["post_date", "dimension", "dimension_id", "case_count"], select))
+        logger.debug(f"Refreshed daily counts of {len(dates)} dates")
+
+    @classmethod
+    def series(
+        cls: "DailyCount", ssn: sa_orm.Session, dimension: str, dimension_id: int, end: dt.date | None = None
+    ) -> list[tuple[dt.date, int]]:
+        """
+        Return `(post_date, case_count)` of *dimension* and *dimension_id* in date order,
+        up to and including *end*.
+        """
+        stmt = (
+            sa.select(cls.post_date, cls.case_count)
+            .where(cls.dimension == dimension, cls.dimension_id == dimension_id)
+            .order_by(cls.post_date)
+        )
+        if end is not None:
+            stmt = stmt.where(cls.post_date <= end)
+        return [tuple(row) for row in ssn.execute(stmt)]
+
+
+#
+#
+
+
+class DimensionCache:
+    """
+    In-memory `name -> id` index of the dimension tables (`Facility`, `Building`,
+    `Department`). Each table is loaded in full with one query on first use, after which
+    lookups are answered from memory.
+
+    *max_age* is the number of seconds after which a table is reloaded on its next use.
+    `None` (default) never reloads, which suits short-lived sessions such as an ingest run.
+    Long-lived caches, such as the one shared by Flask request handlers, should set it so
+    that names added by later ingest runs become visible.
+    """
+
+    models = (Facility, Building, Department)
+
+    def __init__(self, max_age: float | None = None):
+        self.max_age = max_age
+        # Model -> (load time, name -> id). Entries are only ever replaced whole, and
+        # `clear` swaps in a new dict, so threads sharing the cache need no lock.
+        self._tables: dict[type, tuple[float, dict[str, int]]] = {}
+
+    @classmethod
+    def for_session(cls, ssn: sa_orm.Session) -> "DimensionCache":
+        """
+        Return the cache attached to *ssn*, creating it on first use. The cache is cleared
+        when *ssn* rolls back, since ids inserted in the rolled back transaction are gone.
+        """
+        if "dimension_cache" not in ssn.info:
+            cache = ssn.info["dimension_cache"] = cls()
+            sa.event.listen(ssn, "after_rollback", lambda ssn: cache.clear())
+        return ssn.info["dimension_cache"]
+
+    def clear(self) -> None:
+        """
+        Discard all cached tables.
+        """
+        self._tables = {}
+
+    def _table(self, ssn: sa_orm.Session, model: type[IDNameMixin]) -> dict[str, int]:
+        """
+        Return the cached index of *model*, (re)loading it from *ssn* if needed.
+        """
+        entry = self._tables.get(model)
+        if entry is None or (self.max_age is not None and time.monotonic() - entry[0] > self.max_age):
+            entry = (time.monotonic(), dict(ssn.execute(sa.select(model.name, model.id)).all()))
+            self._tables[model] = entry
+            logger.debug(f"Loaded {len(entry[1])} {model.__name__} names")
+        return entry[1]
+
+    def get(self, ssn: sa_orm.Session, model: type[IDNameMixin], name: str | None) -> int | None:
+        """
+        Return the id of *model* named *name*, or `None` if there is no such record. Never
+        inserts.
+        """
+        return self._table(ssn, model).get(name)
+
+    def ids_by_name(
+        self, ssn: sa_orm.Session, model: type[IDNameMixin], names: typ.Iterable[str | None]
+    ) -> dict[str, int]:
+        """
+        Return a `dict` mapping each of *names* to the id of its *model* record. Only names
+        missing from the cache are sent to the database, where they are inserted with
+        `IDNameMixin.ids_by_name`. `None` is discarded. Does not commit.
+        """
+        ids = self._table(ssn, model)
+        names = set(names)
+        names.discard(None)
+        missing = names - ids.keys()
+        if missing:
+            ids.update(model.ids_by_name(ssn=ssn, names=missing))
+        return {name: ids[name] for name in names}
+
+    def id(self, ssn: sa_orm.Session, model: type[IDNameMixin], name: str | None) -> int | None:
+        """
+        Return the id of *model* named *name*, inserting a record if needed. Return `None`
+        if *name* is `None`. Does not commit.
+        """
+        return self.ids_by_name(ssn=ssn, model=model, names=[name]).get(name)
+
+
+class FacilityNormalizer:
+    """
+    Resolves raw facility spellings from case reports to `Facility` ids using the
+    `RawFacility` alias table.
+
+    The alias table is loaded into memory once, so known spellings resolve with a `dict`
+    lookup on their `key`. Unseen spellings are fuzzy matched (memoized) against the keys
+    of the known spellings and facility names. Fuzzy matches are logged for review rather
+    than learned, since a wrong alias would be permanent. Spellings that match nothing
+    become new facilities, whose spellings are learned as aliases and written back in bulk
+    by `flush`.
+
+    *cutoff* is the minimum `difflib` similarity ratio of a fuzzy match. Keys that differ
+    in any number never match.
+    """
+
+    # Words that do not tell facilities apart, e.g. "Groton facility" is "Groton"
+    STOPWORDS = {"facility"}
+
+    def __init__(self, cutoff: float = 0.92):
+        self.cutoff = cutoff
+        self._aliases: dict[str, int] | None = None
+        self._fuzzy: dict[str, int | None] = {}
+        self._learned: dict[str, int] = {}
+
+    @classmethod
+    def for_session(cls, ssn: sa_orm.Session) -> "FacilityNormalizer":
+        """
+        Return the normalizer attached to *ssn*, creating it on first use. The normalizer
+        is reset when *ssn* rolls back.
+        """
+        if "facility_normalizer" not in ssn.info:
+            normalizer = ssn.info["facility_normalizer"] = cls()
+            sa.event.listen(ssn, "after_rollback", lambda ssn: normalizer.clear())
+        return ssn.info["facility_normalizer"]
+
+    @classmethod
+    def key(cls, name: str) -> str:
+        """
+        Return the lookup key of *name*: its casefolded words without punctuation and
+        `STOPWORDS`, e.g. `shaws cove` for "Shaw's Cove facility".
+        """
+        words = re.sub(r"[^\w\s]", " ", re.sub(r"['’]", "", name.casefold())).split()
+        return " ".join(word for word in words if word not in cls.STOPWORDS)
+
+    def clear(self) -> None:
+        self._aliases = None
+        self._fuzzy.clear()
+        self._learned.clear()
+
+    def _index(self, ssn: sa_orm.Session) -> dict[str, int]:
+        if self._aliases is None:
+            facilities = ssn.execute(sa.select(Facility.name, Facility.id)).all()
+            aliases = ssn.execute(sa.select(RawFacility.name, RawFacility.facility_id)).all()
+            self._aliases = {self.key(name): facility_id for name, facility_id in facilities + aliases}
+            logger.debug(f"Loaded {len(aliases)} facility aliases")
+        return self._aliases
+
+    def _match(self, key: str, index: dict[str, int]) -> int | None:
+        if key not in self._fuzzy:
+            numbers = re.findall(r"\d+", key)
+            candidates = [known for known in index if re.findall(r"\d+", known) == numbers]
+            matches = difflib.get_close_matches(key, candidates, n=1, cutoff=self.cutoff)
+            self._fuzzy[key] = index[matches[0]] if matches else None
+        return self._fuzzy[key]
+
+    def resolve(self, ssn: sa_orm.Session, name: str | None) -> int | None:
+        """
+        Return the `Facility` id of raw spelling *name*, or `None` if *name* is `None`.
+        Does not commit.
+        """
+        if name is None:
+            return None
+        index = self._index(ssn)
+        key = self.key(name)
+        facility_id = index.get(key)
+        if facility_id is None:
+            facility_id = self._match(key, index)
+            if facility_id is None:
+                facility_id = DimensionCache.for_session(ssn).id(ssn=ssn, model=Facility, name=name.strip())
+                logger.info(f"New facility '{name.strip()}'")
+                index[key] = facility_id
+                self._learned[name] = facility_id
+            else:
+                logger.warning(
+                    "Fuzzy matched facility '%s' to Facility %s; add a RawFacility alias if this is right",
+                    name,
+                    facility_id,
+                )
+        return facility_id
+
+    def flush(self, ssn: sa_orm.Session) -> int:
+        """
+        Insert the aliases learned since the last flush into `RawFacility` in bulk. Return
+        the number of aliases inserted. Does not commit.
+        """
+        rows = [{"name": name, "facility_id": facility_id} for name, facility_id in self._learned.items()]
+        self._learned.clear()
+        return len(RawFacility.insert_many(ssn=ssn, rows=rows))
@@ -0,0 +1,83 @@
+"""
+Reference rows of `Facility` and `RawFacility`, for databases created from the models
+rather than by the migrations (see `app.models._setup_sqlite`).
+
+These are the rows inserted by migration 075f96603553, and must stay equal to them:
+databases upgraded by the migrations never see changes here. New spellings belong in a
+new migration, and here as well.
+"""
+
+# (id, name)
+FACILITIES = (
+    (1, "Bangor"),
+    (2, "Cape Canaveral"),
+    (3, "Eagle Park"),
+    (4, "Electric Boat Kesselring Site Operation"),
+    (5, "Fitchburg"),
+    (6, "Groton"),
+    (7, "Groton Airport"),
+    (8, "Groton Subase"),
+    (9, "HSI"),
+    (10, "Kentucky"),
+    (11, "King's Bay"),
+    (12, "King's Highway"),
+    (13, "Long Hill Rd"),
+    (14, "New London"),
+    (15, "Newport Engineering Office"),
+    (16, "Newport News"),
+    (17, "Norfolk Naval Shipyard"),
+    (18, "Pennsylvania"),
+    (19, "Philadelphia"),
+    (20, "Portsmouth Naval Shipyard"),
+    (21, "Puget Sound"),
+    (22, "Quonset Point"),
+    (23, "Shaw's Cove"),
+    (24, "South Carolina (Goose Creek)"),
+    (25, "Washington Engineering Office (WEO)"),
+)
+
+# (id, name, facility_id)
+RAW_FACILITIES = (
+    (1, "Bangor", 1),
+    (2, "Bangor facility", 1),
+    (3, "Cape Canaveral", 2),
+    (4, "Cape Canaveral facility", 2),
+    (5, "Eagle Park facility", 3),
+    (6, "Electric Boat Kesselring Site Operation (EB", 4),
+    (7, "Fitchburg", 5),
+    (8, "Groton", 6),
+    (9, "Groton Airport (EB pilot)", 7),
+    (10, "Groton facility", 6),
+    (11, "Groton Subase", 8),
+    (12, "Groton Sub Base", 8),
+    (13, "HSI", 9),
+    (14, "HSI facility (Hawaii)", 9),
+    (15, "Huntington Ingalls Shipyard (HIS)", 16),
+    (16, "Kentucky facility", 10),
+    (17, "King's Bay facility", 11),
+    (18, "King's Highway facility", 12),
+    (19, "Kings Highway facility", 12),
+    (20, "Long Hill Rd", 13),
+    (21, "New London facility", 14),
+    (22, "Newport Engineering Office", 15),
+    (23, "Newport Engineering Office (NEO)", 15),
+    (24, "Newport News facility", 16),
+    (25, "Newport News Shipbuilding (NNS) facility", 16),
+    (26, "Newport News Shipyard", 16),
+    (27, "Newport News Shipyard (NNS)", 16),
+    (28, "Norfolk Naval Shipyard", 17),
+    (29, "Pennsylvania facility", 18),
+    (30, "Philadelphia", 19),
+    (31, "Philadelphia facility", 19),
+    (32, "Portsmouth Naval Shipyard", 20),
+    (33, "Puget Sound facility", 21),
+    (34, "Quonset Point facility", 22),
+    (35, "Quonset Point Facility", 22),
+    (36, "Shaw's Cove", 23),
+    (37, "Shaw's Cove facility", 23),
+    (38, "South Carolina", 24),
+    (39, "South Carolina (Goose Creek) facility", 24),
+    (40, "Sub Base", 8),
+    (41, "Washington Engineering Office (WEO)", 25),
+    (42, "Washington Engineering Office (WEO) facility", 25),
+)
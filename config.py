@@ -19,3 +19,94 @@ class Config(object):
     DB_URI_DEV = f"{PG_DRIVER}://{PG_USER}:{PG_PW}@{PG_HOST_DEV}:{PG_PORT}/{PG_DB_DEV}"
     DB_URI_TEST = f"{PG_DRIVER}://{PG_USER}:{PG_PW}@{PG_HOST_TEST}:{PG_PORT}/{PG_DB_TEST}"
     DB_URI_PROD = f"{PG_DRIVER}://{PG_USER}:{PG_PW}@{PG_HOST_PROD}:{PG_PORT}/{PG_DB_PROD}"
+
+    # Read replicas. Read-only sessions use the replica of their environment, if its host is
+    # set, except within REPLICA_STICKY_SECONDS of a write to the primary by the same
+    # process, which the replica may not have replayed yet.
+    PG_HOST_REPLICA_DEV = os.environ.get("PG_HOST_REPLICA_DEV")
+    PG_HOST_REPLICA_TEST = os.environ.get("PG_HOST_REPLICA_TEST")
+    PG_HOST_REPLICA_PROD = os.environ.get("PG_HOST_REPLICA_PROD")
+
+    DB_URI_REPLICA_DEV = (
+        f"{PG_DRIVER}://{PG_USER}:{PG_PW}@{PG_HOST_REPLICA_DEV}:{PG_PORT}/{PG_DB_DEV}" if PG_HOST_REPLICA_DEV else None
+    )
+    DB_URI_REPLICA_TEST = (
+        f"{PG_DRIVER}://{PG_USER}:{PG_PW}@{PG_HOST_REPLICA_TEST}:{PG_PORT}/{PG_DB_TEST}"
+        if PG_HOST_REPLICA_TEST
+        else None
+    )
+    DB_URI_REPLICA_PROD = (
+        f"{PG_DRIVER}://{PG_USER}:{PG_PW}@{PG_HOST_REPLICA_PROD}:{PG_PORT}/{PG_DB_PROD}"
+        if PG_HOST_REPLICA_PROD
+        else None
+    )
+
+    REPLICA_STICKY_SECONDS = 5
+
+    # SQLite database of the "local" environment, for ingest and analysis without a
+    # database server. Its tables are created from the models on first use rather than
+    # migrated, so delete the file after a schema change.
+    SQLITE_FILE = os.environ.get("SQLITE_FILE") or "./data/EBCovid_local.db"
+    DB_URI_LOCAL = f"sqlite:///{SQLITE_FILE}"
+
+    # Pragmas set on every SQLite connection. In WAL mode readers do not block the writer,
+    # and synchronous=NORMAL only syncs at checkpoints rather than on every commit.
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "foreign_keys": "ON",
+        "busy_timeout": 30000,  # Milliseconds
+        "cache_size": -65536,  # KiB
+        "mmap_size": 268435456,  # Bytes
+        "temp_store": "MEMORY",
+    }
+
+    # Connection pool of each database engine. DB_POOL is "queue" for a pool of up to
+    # DB_POOL_SIZE + DB_MAX_OVERFLOW connections per process, or "null" for no pooling in
+    # the process, so that all workers share the pool of an external pooler such as
+    # PgBouncer. Connections are replaced after DB_POOL_RECYCLE seconds. DB_POOL_TIMEOUT is
+    # the seconds to wait for a free connection.
+    DB_POOL = os.environ.get("DB_POOL") or "queue"
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE") or 5)
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW") or 10)
+    DB_POOL_RECYCLE = 1800
+    DB_POOL_TIMEOUT = 30
+
+    # Milliseconds after which PostgreSQL cancels a statement, or 0 for no limit
+    DB_STATEMENT_TIMEOUT = int(os.environ.get("DB_STATEMENT_TIMEOUT") or 0)
+
+    # Database environment (dev, test, prod, local) used by the Flask app
+    DBENV = os.environ.get("DBENV") or "dev"
+
+    # Seconds before the Flask app reloads its in-memory dimension tables
+    DIMENSION_CACHE_MAX_AGE = 300
+
+    # Seconds until a newly issued API token expires
+    TOKEN_EXPIRES_IN = 3600
+
+    # Maximum number of cached API tokens, and seconds before a cached token is checked
+    # against the database again
+    TOKEN_CACHE_SIZE = 1024
+    TOKEN_CACHE_MAX_AGE = 60
+
+    # Maximum number of cached API responses, and seconds between checks for a new ingest
+    # run, which invalidates them
+    RESPONSE_CACHE_SIZE = 256
+    RESPONSE_CACHE_CHECK_INTERVAL = 10
+
+    # Default and maximum number of cases per page of `/api/cases`
+    API_PAGE_SIZE = 100
+    API_MAX_PAGE_SIZE = 1000
+
+    # Rows fetched from the database per chunk of `/api/export.*`
+    EXPORT_CHUNK_SIZE = 1000
+
+    # Default number of days of the rolling totals of `/api/stats`
+    STATS_ROLLING_DAYS = 7
+
+    # Columnar case file served by `/api/analytics` (see scripts/export_columnar.py). If
+    # unset, cases are read from the database once per ingest run.
+    COLUMNAR_FILE = os.environ.get("COLUMNAR_FILE")
+
+    # Directory of the archive of fetched pages (see scripts/snapshots.py)
+    SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR") or "./snapshots"
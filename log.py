@@ -1,16 +1,58 @@
 """
 Logging setup.
+
+Records are put on a queue by the calling thread, which merges their messages with their
+arguments, and formatted and written to the console (`ch`) and the log file (`fh`) by a
+background thread, so logging never waits on I/O. The
+log file, and its directory, are only created when the first record is written.
+
+The logger drops records below the levels of both handlers before they are created (see
+`set_levels`), so lazy `%s` arguments of such records are never formatted. The level of
+the log file is `LOG_FILE_LEVEL` from the environment, DEBUG by default.
 """
 
+import atexit
+import copy
 import datetime as dt
 import logging
 import logging.handlers
+import os
+import queue
+
+
+class LazyFileHandler(logging.FileHandler):
+    """
+    `logging.FileHandler` that creates its file, and the directory of the file, when the
+    first record is emitted.
+    """
+
+    def __init__(self, filename: str):
+        super().__init__(filename=filename, delay=True)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class InProcessQueueHandler(logging.handlers.QueueHandler):
+    """
+    `QueueHandler` for an in-process queue. Like the stock `prepare`, the message is merged
+    with its arguments on the calling thread, since arguments such as ORM objects may only
+    be used there. Unlike it, the record is not formatted or stripped for pickling; the
+    timestamp, header and traceback are formatted by the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        return record
+
 
 logger = logging.getLogger("EBCovid")
-logger.setLevel(logging.DEBUG)
 
 ch = logging.StreamHandler()
-fh = logging.FileHandler(filename=f"./logs/EBCovid_{dt.datetime.now().strftime('%Y%m%d-%H%M%S')}.log")
+fh = LazyFileHandler(filename=f"./logs/EBCovid_{dt.datetime.now().strftime('%Y%m%d-%H%M%S')}.log")
 
 fm = logging.Formatter(
     fmt="[%(asctime)s - %(name)s - %(levelname)s] %(message)s",
@@ -19,7 +61,36 @@ fm = logging.Formatter(
 
 ch.setFormatter(fm)
 fh.setFormatter(fm)
-fh.setLevel(logging.DEBUG)
 
-logger.addHandler(ch)
-logger.addHandler(fh)
+
+def set_levels(console: int | str | None = None, file: int | str | None = None) -> None:
+    """
+    Set the level of the console and/or of the log file, and the level of the logger to
+    the lower of both.
+    """
+    if console is not None:
+        ch.setLevel(console)
+    if file is not None:
+        fh.setLevel(file)
+    logger.setLevel(min(ch.level, fh.level))
+
+
+set_levels(console=logging.DEBUG, file=os.environ.get("LOG_FILE_LEVEL") or logging.DEBUG)
+
+qh = InProcessQueueHandler(queue.SimpleQueue())
+listener = logging.handlers.QueueListener(qh.queue, ch, fh, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)  # Drains the queue
+
+
+def _log_directly() -> None:
+    # The listener thread does not survive a fork, and forked workers (e.g. of a process
+    # pool) exit without running `atexit`, so they write to the handlers themselves
+    logger.removeHandler(qh)
+    logger.addHandler(ch)
+    logger.addHandler(fh)
+
+
+os.register_at_fork(after_in_child=_log_directly)
+
+logger.addHandler(qh)
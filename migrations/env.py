@@ -22,9 +22,9 @@ logger = logging.getLogger("alembic.env")
 
 
 # If a db section is passed using the '-x' option, only target that database for the
-# migration. Otherwise, target all databases.
+# migration. Otherwise, target all databases. Other '-x' options are read by migrations.
 cmd_kwargs = context.get_x_argument(as_dictionary=True)
-if cmd_kwargs:
+if "db" in cmd_kwargs:
     db_names = [cmd_kwargs["db"]]
 else:
     db_names = re.split(r",\s*", config.get_main_option("databases"))
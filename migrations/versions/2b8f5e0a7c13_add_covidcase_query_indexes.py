@@ -0,0 +1,218 @@
+"""Add CovidCase query indexes and optional partitioning by post_date
+
+Pass `-x partition=yes` to also range-partition CovidCase by year of post_date
+(PostgreSQL 15 or later), e.g.
+
+    alembic -x db=prod -x partition=yes upgrade head
+
+Unique keys of a partitioned table must include post_date, so the database then only keeps
+case numbers unique per post date. Ingest skips known case numbers itself (see
+`CovidCase.existing_case_nums`), so a case re-posted on another day is not inserted again,
+but other writers to CovidCase must do the same.
+
+Revision ID: 2b8f5e0a7c13
+Revises: 6c2e8f1b4d07
+Create Date: 2026-10-17 19:24:10.306518
+
+"""
+import typing as typ
+
+import sqlalchemy as sa
+from alembic import context
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2b8f5e0a7c13"
+down_revision = "6c2e8f1b4d07"
+branch_labels = None
+depends_on = None
+
+# Name -> columns of the indexes for the filters of `/api/cases` and `/api/export.*`, and
+# for the foreign key to Building
+INDEXES = {
+    "ix_CovidCase_facility_id_post_date_id": ["facility_id", "post_date", "id"],
+    "ix_CovidCase_department_id_post_date_id": ["department_id", "post_date", "id"],
+    "ix_CovidCase_building_id": ["building_id"],
+    "ix_CovidCase_test_date": ["test_date"],
+}
+
+# Years of the yearly partitions. Other and NULL post dates go to "CovidCase_default".
+PARTITION_YEARS = range(2020, 2031)
+
+FOREIGN_KEYS = {"facility_id": "Facility", "building_id": "Building", "department_id": "Department"}
+
+# Representative queries -> partitions they may scan if CovidCase is partitioned, or `None`
+# if they cannot be pruned
+PLAN_CHECKS = {
+    # `/api/cases` by facility and by department
+    """SELECT id FROM "CovidCase" WHERE post_date IS NOT NULL AND facility_id = 1
+    AND post_date BETWEEN '2021-01-01' AND '2021-06-30' ORDER BY post_date DESC, id DESC LIMIT 101""": {
+        "CovidCase_2021"
+    },
+    """SELECT id FROM "CovidCase" WHERE post_date IS NOT NULL AND department_id = 1
+    AND post_date BETWEEN '2021-01-01' AND '2021-06-30' ORDER BY post_date DESC, id DESC LIMIT 101""": {
+        "CovidCase_2021"
+    },
+    # `DailyCount.refresh`
+    """SELECT post_date, facility_id, count(*) FROM "CovidCase"
+    WHERE post_date IN ('2021-03-01', '2022-03-01') GROUP BY post_date, facility_id""": {
+        "CovidCase_2021",
+        "CovidCase_2022",
+    },
+    """SELECT id FROM "CovidCase" WHERE test_date BETWEEN '2021-01-01' AND '2021-01-31'""": None,
+    # Ingest deduplication
+    """SELECT id FROM "CovidCase" WHERE content_hash = '00000000000000000000000000000000'""": None,
+    """SELECT id FROM "CovidCase" WHERE case_num = 1""": None,
+}
+
+
+def _partition_requested() -> bool:
+    return context.get_x_argument(as_dictionary=True).get("partition", "no").lower() in ["yes", "true", "1"]
+
+
+def _is_partitioned() -> bool:
+    return bool(
+        op.get_bind().scalar(
+            sa.text("""SELECT count(*) FROM pg_partitioned_table WHERE partrelid = '"CovidCase"'::regclass""")
+        )
+    )
+
+
+def _rebuild(partitioned: bool) -> None:
+    """
+    Recreate CovidCase with its rows, range-partitioned by post_date if *partitioned*. The
+    constraints and indexes of the old table are dropped with it (see `_create_keys`).
+    """
+    op.execute('ALTER TABLE "CovidCase" RENAME TO "CovidCase_old"')
+    op.execute(
+        'CREATE TABLE "CovidCase" (LIKE "CovidCase_old" INCLUDING DEFAULTS)'
+        + (" PARTITION BY RANGE (post_date)" if partitioned else "")
+    )
+    op.execute('ALTER SEQUENCE "CovidCase_id_seq" OWNED BY "CovidCase".id')
+    if partitioned:
+        for year in PARTITION_YEARS:
+            op.execute(
+                f'CREATE TABLE "CovidCase_{year}" PARTITION OF "CovidCase" '
+                f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+            )
+        op.execute('CREATE TABLE "CovidCase_default" PARTITION OF "CovidCase" DEFAULT')
+    op.execute('INSERT INTO "CovidCase" SELECT * FROM "CovidCase_old"')
+    op.execute('DROP TABLE "CovidCase_old"')
+
+
+def _create_keys(partitioned: bool) -> None:
+    """
+    Create the primary, unique and foreign keys of CovidCase, and its post_date index.
+    """
+    if partitioned:
+        # Unique keys of a partitioned table must include the partition key, and post_date
+        # may be NULL, so there is no primary key. A case number is then only unique per
+        # post date, and ingest must check it (see the module docstring). The content hash
+        # covers post_date, so it is still unique per case; NULLS NOT DISTINCT keeps it
+        # unique among undated cases, too.
+        op.create_unique_constraint(op.f("uq_CovidCase_id"), "CovidCase", ["id", "post_date"])
+        op.create_unique_constraint(op.f("uq_CovidCase_case_num"), "CovidCase", ["case_num", "post_date"])
+        op.execute(
+            'ALTER TABLE "CovidCase" ADD CONSTRAINT "uq_CovidCase_content_hash" '
+            "UNIQUE NULLS NOT DISTINCT (content_hash, post_date)"
+        )
+    else:
+        op.create_primary_key(op.f("pk_CovidCase"), "CovidCase", ["id"])
+        op.create_unique_constraint(op.f("uq_CovidCase_case_num"), "CovidCase", ["case_num"])
+        op.create_unique_constraint(op.f("uq_CovidCase_content_hash"), "CovidCase", ["content_hash"])
+    for column, table in FOREIGN_KEYS.items():
+        op.create_foreign_key(op.f(f"fk_CovidCase_{column}_{table}_id"), "CovidCase", table, [column], ["id"])
+    op.create_index("ix_CovidCase_post_date_id", "CovidCase", ["post_date", "id"])
+
+
+def _scans(plan: dict[str, typ.Any]) -> typ.Iterator[dict[str, typ.Any]]:
+    """
+    Yield the nodes of *plan* (`EXPLAIN (FORMAT JSON)`) that read a table.
+    """
+    if "Relation Name" in plan:
+        yield plan
+    for child in plan.get("Plans", []):
+        yield from _scans(child)
+
+
+def _check_plans() -> None:
+    """
+    Raise `RuntimeError` unless the planner answers each of `PLAN_CHECKS` without a
+    sequential scan and, if CovidCase is partitioned, scans only the listed partitions.
+    Sequential scans are disabled during the check, so that the planner only picks one if no
+    index applies, however small the table.
+    """
+    conn = op.get_bind()
+    partitioned = _is_partitioned()
+    conn.execute(sa.text('ANALYZE "CovidCase"'))
+    conn.execute(sa.text("SET LOCAL enable_seqscan = off"))
+    try:
+        for query, partitions in PLAN_CHECKS.items():
+            plan = conn.scalar(sa.text(f"EXPLAIN (FORMAT JSON) {query}"))
+            scans = list(_scans(plan[0]["Plan"]))
+            sequential = sorted({scan["Relation Name"] for scan in scans if scan["Node Type"] == "Seq Scan"})
+            if sequential:
+                raise RuntimeError(f"Planner scans {', '.join(sequential)} sequentially for: {query}")
+            scanned = {scan["Relation Name"] for scan in scans}
+            if partitioned and partitions is not None and not scanned <= partitions:
+                raise RuntimeError(f"Planner scans {', '.join(sorted(scanned - partitions))} for: {query}")
+    finally:
+        conn.execute(sa.text("RESET enable_seqscan"))
+
+
+def _upgrade() -> None:
+    if _partition_requested():
+        if op.get_context().dialect.name != "postgresql":
+            raise RuntimeError("Partitioning CovidCase requires PostgreSQL")
+        if not context.is_offline_mode() and op.get_bind().dialect.server_version_info < (15,):
+            raise RuntimeError("Partitioning CovidCase requires PostgreSQL 15 or later")
+        _rebuild(partitioned=True)
+        _create_keys(partitioned=True)
+
+    for name, columns in INDEXES.items():
+        op.create_index(name, "CovidCase", columns)
+
+    if op.get_context().dialect.name == "postgresql" and not context.is_offline_mode():
+        _check_plans()
+
+
+def _downgrade() -> None:
+    if op.get_context().dialect.name == "postgresql" and not context.is_offline_mode() and _is_partitioned():
+        # Drops the indexes, too
+        _rebuild(partitioned=False)
+        _create_keys(partitioned=False)
+    else:
+        for name in INDEXES:
+            op.drop_index(name, table_name="CovidCase")
+
+
+def upgrade(engine_name: str) -> None:
+    globals()["upgrade_%s" % engine_name]()
+
+
+def downgrade(engine_name: str) -> None:
+    globals()["downgrade_%s" % engine_name]()
+
+
+def upgrade_dev() -> None:
+    _upgrade()
+
+
+def downgrade_dev() -> None:
+    _downgrade()
+
+
+def upgrade_test() -> None:
+    _upgrade()
+
+
+def downgrade_test() -> None:
+    _downgrade()
+
+
+def upgrade_prod() -> None:
+    _upgrade()
+
+
+def downgrade_prod() -> None:
+    _downgrade()
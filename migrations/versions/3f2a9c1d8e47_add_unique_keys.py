@@ -0,0 +1,73 @@
+"""Add unique keys for bulk ingest
+
+Revision ID: 3f2a9c1d8e47
+Revises: 075f96603553
+Create Date: 2026-10-16 09:12:41.518302
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3f2a9c1d8e47"
+down_revision = "075f96603553"
+branch_labels = None
+depends_on = None
+
+
+def _upgrade() -> None:
+    for table in ["Building", "Department", "Facility"]:
+        op.create_unique_constraint(op.f(f"uq_{table}_name"), table, ["name"])
+
+    op.create_index(
+        "uq_CovidCase_natural_key",
+        "CovidCase",
+        [
+            sa.text("coalesce(facility_id, 0)"),
+            sa.text("coalesce(building_id, 0)"),
+            sa.text("coalesce(department_id, 0)"),
+            sa.text("coalesce(last_work_date, '1900-01-01')"),
+            sa.text("coalesce(test_date, '1900-01-01')"),
+            sa.text("coalesce(post_date, '1900-01-01')"),
+        ],
+        unique=True,
+    )
+
+
+def _downgrade() -> None:
+    op.drop_index("uq_CovidCase_natural_key", table_name="CovidCase")
+
+    for table in ["Building", "Department", "Facility"]:
+        op.drop_constraint(op.f(f"uq_{table}_name"), table, type_="unique")
+
+
+def upgrade(engine_name: str) -> None:
+    globals()["upgrade_%s" % engine_name]()
+
+
+def downgrade(engine_name: str) -> None:
+    globals()["downgrade_%s" % engine_name]()
+
+
+def upgrade_dev() -> None:
+    _upgrade()
+
+
+def downgrade_dev() -> None:
+    _downgrade()
+
+
+def upgrade_test() -> None:
+    _upgrade()
+
+
+def downgrade_test() -> None:
+    _downgrade()
+
+
+def upgrade_prod() -> None:
+    _upgrade()
+
+
+def downgrade_prod() -> None:
+    _downgrade()
@@ -0,0 +1,76 @@
+"""Add table DailyCount
+
+Revision ID: 4d7c1e9f3a28
+Revises: e8a4f27b6c19
+Create Date: 2026-10-17 18:40:27.663105
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "4d7c1e9f3a28"
+down_revision = "e8a4f27b6c19"
+branch_labels = None
+depends_on = None
+
+
+def _upgrade() -> None:
+    op.create_table(
+        "DailyCount",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("dimension", sa.String(length=100), nullable=False),
+        sa.Column("dimension_id", sa.Integer(), nullable=False),
+        sa.Column("post_date", sa.Date(), nullable=False),
+        sa.Column("case_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_DailyCount")),
+        sa.UniqueConstraint("dimension", "dimension_id", "post_date", name=op.f("uq_DailyCount_dimension")),
+    )
+    # Backfill from the existing cases
+    op.execute(
+        """INSERT INTO "DailyCount" (post_date, dimension, dimension_id, case_count) """
+        """SELECT post_date, 'total', 0, count(*) FROM "CovidCase" """
+        """WHERE post_date IS NOT NULL GROUP BY post_date"""
+    )
+    for dimension in ["facility", "building", "department"]:
+        op.execute(
+            f"""INSERT INTO "DailyCount" (post_date, dimension, dimension_id, case_count) """
+            f"""SELECT post_date, '{dimension}', coalesce({dimension}_id, 0), count(*) FROM "CovidCase" """
+            f"""WHERE post_date IS NOT NULL GROUP BY post_date, coalesce({dimension}_id, 0)"""
+        )
+
+
+def _downgrade() -> None:
+    op.drop_table("DailyCount")
+
+
+def upgrade(engine_name: str) -> None:
+    globals()["upgrade_%s" % engine_name]()
+
+
+def downgrade(engine_name: str) -> None:
+    globals()["downgrade_%s" % engine_name]()
+
+
+def upgrade_dev() -> None:
+    _upgrade()
+
+
+def downgrade_dev() -> None:
+    _downgrade()
+
+
+def upgrade_test() -> None:
+    _upgrade()
+
+
+def downgrade_test() -> None:
+    _downgrade()
+
+
+def upgrade_prod() -> None:
+    _upgrade()
+
+
+def downgrade_prod() -> None:
+    _downgrade()
@@ -0,0 +1,95 @@
+"""Add CovidCase case number and content hash
+
+Revision ID: 6c2e8f1b4d07
+Revises: a3b9d0c6e512
+Create Date: 2026-10-17 18:02:55.731946
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "6c2e8f1b4d07"
+down_revision = "a3b9d0c6e512"
+branch_labels = None
+depends_on = None
+
+# Same as `CovidCase.hash_content`
+CONTENT_HASH = """md5(concat_ws('|',
+    coalesce(case_num::text, ''),
+    coalesce(facility_id::text, ''),
+    coalesce(building_id::text, ''),
+    coalesce(department_id::text, ''),
+    coalesce(to_char(last_work_date, 'YYYY-MM-DD'), ''),
+    coalesce(to_char(test_date, 'YYYY-MM-DD'), ''),
+    coalesce(to_char(post_date, 'YYYY-MM-DD'), '')
+))"""
+
+
+def _upgrade() -> None:
+    op.add_column("CovidCase", sa.Column("case_num", sa.Integer(), nullable=True))
+    op.add_column("CovidCase", sa.Column("content_hash", sa.String(length=32), nullable=True))
+
+    # Existing cases were stored without their case number, so only the hash is backfilled.
+    # The natural key index guarantees the hashes are unique.
+    op.execute(sa.text(f'UPDATE "CovidCase" SET content_hash = {CONTENT_HASH}'))
+    op.alter_column("CovidCase", "content_hash", nullable=False)
+
+    op.create_unique_constraint(op.f("uq_CovidCase_case_num"), "CovidCase", ["case_num"])
+    op.create_unique_constraint(op.f("uq_CovidCase_content_hash"), "CovidCase", ["content_hash"])
+    op.drop_index("uq_CovidCase_natural_key", table_name="CovidCase")
+
+
+def _downgrade() -> None:
+    # Fails if cases with distinct case numbers share their fields, as the natural key
+    # cannot tell them apart
+    op.create_index(
+        "uq_CovidCase_natural_key",
+        "CovidCase",
+        [
+            sa.text("coalesce(facility_id, 0)"),
+            sa.text("coalesce(building_id, 0)"),
+            sa.text("coalesce(department_id, 0)"),
+            sa.text("coalesce(last_work_date, '1900-01-01')"),
+            sa.text("coalesce(test_date, '1900-01-01')"),
+            sa.text("coalesce(post_date, '1900-01-01')"),
+        ],
+        unique=True,
+    )
+    op.drop_constraint(op.f("uq_CovidCase_content_hash"), "CovidCase", type_="unique")
+    op.drop_constraint(op.f("uq_CovidCase_case_num"), "CovidCase", type_="unique")
+
+    op.drop_column("CovidCase", "content_hash")
+    op.drop_column("CovidCase", "case_num")
+
+
+def upgrade(engine_name: str) -> None:
+    globals()["upgrade_%s" % engine_name]()
+
+
+def downgrade(engine_name: str) -> None:
+    globals()["downgrade_%s" % engine_name]()
+
+
+def upgrade_dev() -> None:
+    _upgrade()
+
+
+def downgrade_dev() -> None:
+    _downgrade()
+
+
+def upgrade_test() -> None:
+    _upgrade()
+
+
+def downgrade_test() -> None:
+    _downgrade()
+
+
+def upgrade_prod() -> None:
+    _upgrade()
+
+
+def downgrade_prod() -> None:
+    _downgrade()
@@ -0,0 +1,62 @@
+"""Add table IngestRun
+
+Revision ID: 9b41e6d2a0c5
+Revises: 3f2a9c1d8e47
+Create Date: 2026-10-17 10:04:12.930114
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9b41e6d2a0c5"
+down_revision = "3f2a9c1d8e47"
+branch_labels = None
+depends_on = None
+
+
+def _upgrade() -> None:
+    op.create_table(
+        "IngestRun",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("case_num", sa.Integer(), nullable=True),
+        sa.Column("post_date", sa.Date(), nullable=True),
+        sa.Column("createdon", sa.DateTime(), server_default=sa.text("now()"), nullable=True),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_IngestRun")),
+    )
+
+
+def _downgrade() -> None:
+    op.drop_table("IngestRun")
+
+
+def upgrade(engine_name: str) -> None:
+    globals()["upgrade_%s" % engine_name]()
+
+
+def downgrade(engine_name: str) -> None:
+    globals()["downgrade_%s" % engine_name]()
+
+
+def upgrade_dev() -> None:
+    _upgrade()
+
+
+def downgrade_dev() -> None:
+    _downgrade()
+
+
+def upgrade_test() -> None:
+    _upgrade()
+
+
+def downgrade_test() -> None:
+    _downgrade()
+
+
+def upgrade_prod() -> None:
+    _upgrade()
+
+
+def downgrade_prod() -> None:
+    _downgrade()
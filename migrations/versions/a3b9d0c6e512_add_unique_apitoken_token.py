@@ -0,0 +1,54 @@
+"""Add unique APIToken token
+
+Revision ID: a3b9d0c6e512
+Revises: 4d7c1e9f3a28
+Create Date: 2026-10-17 20:05:51.304417
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a3b9d0c6e512"
+down_revision = "4d7c1e9f3a28"
+branch_labels = None
+depends_on = None
+
+
+def _upgrade() -> None:
+    op.create_unique_constraint(op.f("uq_APIToken_token"), "APIToken", ["token"])
+
+
+def _downgrade() -> None:
+    op.drop_constraint(op.f("uq_APIToken_token"), "APIToken", type_="unique")
+
+
+def upgrade(engine_name: str) -> None:
+    globals()["upgrade_%s" % engine_name]()
+
+
+def downgrade(engine_name: str) -> None:
+    globals()["downgrade_%s" % engine_name]()
+
+
+def upgrade_dev() -> None:
+    _upgrade()
+
+
+def downgrade_dev() -> None:
+    _downgrade()
+
+
+def upgrade_test() -> None:
+    _upgrade()
+
+
+def downgrade_test() -> None:
+    _downgrade()
+
+
+def upgrade_prod() -> None:
+    _upgrade()
+
+
+def downgrade_prod() -> None:
+    _downgrade()
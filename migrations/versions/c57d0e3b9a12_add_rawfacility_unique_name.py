@@ -0,0 +1,70 @@
+"""Add unique RawFacility name and fix id sequences
+
+Revision ID: c57d0e3b9a12
+Revises: 9b41e6d2a0c5
+Create Date: 2026-10-17 14:31:08.207653
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c57d0e3b9a12"
+down_revision = "9b41e6d2a0c5"
+branch_labels = None
+depends_on = None
+
+
+def _sync_sequences() -> None:
+    # Revision 075f96603553 inserted Facility and RawFacility rows with explicit ids, which
+    # leaves their id sequences behind the data
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for table in ["Facility", "RawFacility"]:
+        op.execute(
+            sa.text(
+                f"""SELECT setval(pg_get_serial_sequence('"{table}"', 'id'), coalesce(max(id), 0) + 1, false) """
+                f'FROM "{table}"'
+            )
+        )
+
+
+def _upgrade() -> None:
+    op.create_unique_constraint(op.f("uq_RawFacility_name"), "RawFacility", ["name"])
+    _sync_sequences()
+
+
+def _downgrade() -> None:
+    op.drop_constraint(op.f("uq_RawFacility_name"), "RawFacility", type_="unique")
+
+
+def upgrade(engine_name: str) -> None:
+    globals()["upgrade_%s" % engine_name]()
+
+
+def downgrade(engine_name: str) -> None:
+    globals()["downgrade_%s" % engine_name]()
+
+
+def upgrade_dev() -> None:
+    _upgrade()
+
+
+def downgrade_dev() -> None:
+    _downgrade()
+
+
+def upgrade_test() -> None:
+    _upgrade()
+
+
+def downgrade_test() -> None:
+    _downgrade()
+
+
+def upgrade_prod() -> None:
+    _upgrade()
+
+
+def downgrade_prod() -> None:
+    _downgrade()
@@ -0,0 +1,54 @@
+"""Add index CovidCase post_date, id
+
+Revision ID: e8a4f27b6c19
+Revises: c57d0e3b9a12
+Create Date: 2026-10-17 16:12:45.518202
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e8a4f27b6c19"
+down_revision = "c57d0e3b9a12"
+branch_labels = None
+depends_on = None
+
+
+def _upgrade() -> None:
+    op.create_index("ix_CovidCase_post_date_id", "CovidCase", ["post_date", "id"])
+
+
+def _downgrade() -> None:
+    op.drop_index("ix_CovidCase_post_date_id", table_name="CovidCase")
+
+
+def upgrade(engine_name: str) -> None:
+    globals()["upgrade_%s" % engine_name]()
+
+
+def downgrade(engine_name: str) -> None:
+    globals()["downgrade_%s" % engine_name]()
+
+
+def upgrade_dev() -> None:
+    _upgrade()
+
+
+def downgrade_dev() -> None:
+    _downgrade()
+
+
+def upgrade_test() -> None:
+    _upgrade()
+
+
+def downgrade_test() -> None:
+    _downgrade()
+
+
+def upgrade_prod() -> None:
+    _upgrade()
+
+
+def downgrade_prod() -> None:
+    _downgrade()
@@ -0,0 +1,523 @@
+"""
+Benchmark suite for the ingest and API hot paths.
+
+Runs against the bundled fixtures in tests/fixtures and, by default, a throwaway SQLite
+database. Results are written as JSON and compared with the previous run, e.g.
+
+    python -m scripts.bench                  # SQLite, compare with the latest result
+    python -m scripts.bench --dbenv test     # PostgreSQL test environment
+
+Each result is a `dict` of metrics. Metrics ending in `_per_sec` are rates (higher is
+better); metrics ending in `_ms` are latencies (lower is better).
+"""
+
+import argparse
+import collections
+import datetime as dt
+import json
+import pathlib
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing as typ
+
+import numpy as np
+import sqlalchemy as sa
+import sqlalchemy.orm as sa_orm
+
+import app.analytics as analytics
+import app.columnar as columnar
+import app.models as db
+import log
+from app import create_app
+from app.api import tokens
+from config import Config
+from scripts import ingest
+from tests.fixtures import load_corpus
+from tests.fixtures import load_page
+
+logger = log.logging.getLogger("EBCovid.bench")
+
+# Dimension values created by the benchmark are prefixed so they can be cleaned up
+# afterwards without touching real data.
+PREFIX = "bench-"
+
+RESULTS_DIR = pathlib.Path("./bench_results")
+
+# dbenv under which the throwaway SQLite database is registered
+SQLITE_DBENV = "bench"
+
+# Rows of the synthetic columnar file
+COLUMNAR_ROWS = 1_000_000
+
+# Rows of the synthetic analytics dataset. The per-row baseline dominates the run time.
+ANALYTICS_ROWS = 200_000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--dbenv",
+        help="Run database benchmarks against environment X (dev, test, prod, local) instead of a throwaway SQLite "
+        "database",
+        metavar="X",
+        type=str,
+        dest="dbenv",
+        default=None,
+    )
+    parser.add_argument(
+        "-n",
+        help="Number of synthetic cases for database benchmarks. Defaults to 3000.",
+        metavar="N",
+        type=int,
+        dest="n",
+        default=3000,
+    )
+    parser.add_argument(
+        "--seconds",
+        help="Run each CPU benchmark for about S seconds. Defaults to 2.",
+        metavar="S",
+        type=float,
+        dest="seconds",
+        default=2.0,
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help=f"Write results to PATH. Defaults to a timestamped file in {RESULTS_DIR}.",
+        metavar="PATH",
+        type=pathlib.Path,
+        dest="output",
+        default=None,
+    )
+    parser.add_argument(
+        "--baseline",
+        help=f"Compare with results at PATH. Defaults to the latest file in {RESULTS_DIR}.",
+        metavar="PATH",
+        type=pathlib.Path,
+        dest="baseline",
+        default=None,
+    )
+    parser.add_argument(
+        "--tolerance",
+        help="Flag metrics more than F (fraction) worse than the baseline. Defaults to 0.1.",
+        metavar="F",
+        type=float,
+        dest="tolerance",
+        default=0.1,
+    )
+
+    args = parser.parse_args()
+
+    if args.dbenv is not None and args.dbenv not in db.DBENVS:
+        parser.error(f"--dbenv must be one of {', '.join(db.DBENVS)}")
+
+    return args
+
+
+def check_parse_case() -> None:
+    """
+    Raise `AssertionError` if `ingest.parse_case` disagrees with the regression corpus.
+    """
+    for text, post_day, expected in load_corpus():
+        actual = ingest.parse_case(text=ingest.sanitize(text), post_day=post_day)
+        assert actual == expected, f"parse_case({text!r}) returned {actual}, expected {expected}"
+
+
+def check_parsers() -> None:
+    """
+    Raise `AssertionError` unless all `ingest.PARSERS` backends return the same cases for
+    the bundled page.
+    """
+    html = load_page()
+    expected = ingest.parse_html(page=html, parser=ingest.PARSERS[0])
+    for parser in ingest.PARSERS[1:]:
+        assert ingest.parse_html(page=html, parser=parser) == expected, f"{parser} disagrees with {ingest.PARSERS[0]}"
+
+
+def synthetic_cases(n: int, seed: int = 0) -> list[dict[str, typ.Any]]:
+    """
+    Return *n* synthetic cases shaped like the output of `ingest.parse_case`. Dimension
+    values are drawn from a few dozen distinct names, like the real data. Case numbers are
+    negative, so that they never collide with those of real cases.
+    """
+    rng = random.Random(seed)
+    start = dt.date(2020, 3, 1) + dt.timedelta(days=seed * 1000)
+    cases = []
+    for i in range(n):
+        post_day = start + dt.timedelta(days=rng.randrange(900))
+        cases.append(
+            {
+                "id": -(i + 1),
+                "facility": f"{PREFIX}facility {rng.randrange(25)}",
+                "dept": f"{PREFIX}{rng.randrange(40)}",
+                "bldg": f"{PREFIX}{rng.randrange(30)}",
+                "post_day": post_day,
+                "last_day": post_day - dt.timedelta(days=rng.randrange(1, 10)),
+                "test_day": post_day - dt.timedelta(days=rng.randrange(0, 5)),
+            }
+        )
+    return cases
+
+
+def create_sqlite_dbenv() -> str:
+    """
+    Create a throwaway SQLite database from `db.Metadata`, register it as a dbenv and
+    return the dbenv.
+    """
+    path = pathlib.Path(tempfile.mkdtemp()) / "bench.db"
+    db.register_dbenv(dbenv=SQLITE_DBENV, url=f"sqlite:///{path}")
+    db.engines.engine(SQLITE_DBENV)  # Creates the tables
+    logger.info(f"Created SQLite database {path}")
+    return SQLITE_DBENV
+
+
+def cleanup(dbenv: str, last_run_id: int | None) -> None:
+    """
+    Delete all records created by the benchmark from database *dbenv*, including ingest
+    runs after *last_run_id*, so that the real high-water mark is untouched.
+    """
+    with db.ssn_from_dbenv(dbenv=dbenv) as ssn, ssn.begin():
+        facility_ids = sa.select(db.Facility.id).where(db.Facility.name.startswith(PREFIX))
+        post_dates = ssn.scalars(
+            sa.select(db.CovidCase.post_date).where(db.CovidCase.facility_id.in_(facility_ids)).distinct()
+        ).all()
+        ssn.execute(sa.delete(db.CovidCase).where(db.CovidCase.facility_id.in_(facility_ids)))
+        db.DailyCount.refresh(ssn=ssn, dates=post_dates)
+        ssn.execute(sa.delete(db.RawFacility).where(db.RawFacility.facility_id.in_(facility_ids)))
+        for model in [db.Facility, db.Department, db.Building]:
+            ssn.execute(sa.delete(model).where(model.name.startswith(PREFIX)))
+        ssn.execute(sa.delete(db.IngestRun).where(db.IngestRun.id > (last_run_id or 0)))
+        user_ids = sa.select(db.User.id).where(db.User.email.startswith(PREFIX))
+        ssn.execute(sa.delete(db.APIToken).where(db.APIToken.user_id.in_(user_ids)))
+        ssn.execute(sa.delete(db.User).where(db.User.email.startswith(PREFIX)))
+
+
+def rate(func: typ.Callable[[], int], seconds: float) -> float:
+    """
+    Call *func* repeatedly for about *seconds* and return the number of items it reports
+    processing per second.
+    """
+    n = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        n += func()
+    return n / (time.perf_counter() - start)
+
+
+class CommitTimer:
+    """
+    Context manager recording the duration of each `Session.commit` (flush and `COMMIT`)
+    while it is active.
+    """
+
+    def __init__(self):
+        self.durations: list[float] = []
+        self._start: float | None = None
+
+    def _before(self, ssn):
+        self._start = time.perf_counter()
+
+    def _after(self, ssn):
+        if self._start is not None:
+            self.durations.append(time.perf_counter() - self._start)
+            self._start = None
+
+    def __enter__(self) -> "CommitTimer":
+        sa.event.listen(sa_orm.Session, "before_commit", self._before)
+        sa.event.listen(sa_orm.Session, "after_commit", self._after)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        sa.event.remove(sa_orm.Session, "before_commit", self._before)
+        sa.event.remove(sa_orm.Session, "after_commit", self._after)
+
+    def metrics(self) -> dict[str, float]:
+        ms = sorted(d * 1000 for d in self.durations) or [0.0]
+        return {
+            "commits": len(self.durations),
+            "commit_p50_ms": statistics.median(ms),
+            "commit_p95_ms": ms[min(len(ms) - 1, int(len(ms) * 0.95))],
+        }
+
+
+def bench_sanitize(seconds: float) -> dict[str, float]:
+    texts = [text for text, _, _ in load_corpus()]
+
+    def run():
+        for text in texts:
+            ingest.sanitize(text)
+        return len(texts)
+
+    return {"texts_per_sec": rate(run, seconds)}
+
+
+def bench_grep_date(seconds: float) -> dict[str, float]:
+    texts = [ingest.sanitize(text) for text, _, _ in load_corpus()]
+
+    def run():
+        for text in texts:
+            ingest.grep_date(ingest.TEST_DAY_RE, text, "test_day", 2020)
+        return len(texts)
+
+    return {"texts_per_sec": rate(run, seconds)}
+
+
+def bench_parse_case(seconds: float) -> dict[str, float]:
+    corpus = [(ingest.sanitize(text), post_day) for text, post_day, _ in load_corpus()]
+
+    def run():
+        for text, post_day in corpus:
+            ingest.parse_case(text=text, post_day=post_day)
+        return len(corpus)
+
+    return {"cases_per_sec": rate(run, seconds)}
+
+
+def bench_parse_html(seconds: float, parser: str) -> dict[str, float]:
+    html = load_page()
+    return {"cases_per_sec": rate(lambda: len(ingest.parse_html(page=html, parser=parser)), seconds)}
+
+
+def bench_to_db(to_db: typ.Callable, cases: list[dict[str, typ.Any]], dbenv: str) -> dict[str, float]:
+    """
+    Time *to_db* on *cases*, first into an empty target and then as a re-ingest of the
+    same cases.
+    """
+    with db.ssn_from_dbenv(dbenv=dbenv) as ssn:
+        latest = db.IngestRun.latest(ssn)
+    last_run_id = latest.id if latest is not None else None
+
+    results = {}
+    try:
+        cleanup(dbenv, last_run_id)
+        for scenario in ["insert", "reingest"]:
+            with CommitTimer() as timer:
+                start = time.perf_counter()
+                to_db(cases, dbenv)
+                elapsed = time.perf_counter() - start
+            results[f"{scenario}_cases_per_sec"] = len(cases) / elapsed
+            results.update({f"{scenario}_{k}": v for k, v in timer.metrics().items()})
+    finally:
+        cleanup(dbenv, last_run_id)
+    return results
+
+
+def bench_token_auth(dbenv: str, seconds: float) -> dict[str, float]:
+    """
+    Load test the protected `/api/stats` with and without the token cache. The response
+    cache is warm throughout, so token verification is the only database work left.
+    """
+    with db.ssn_from_dbenv(dbenv=dbenv) as ssn:
+        latest = db.IngestRun.latest(ssn)
+    last_run_id = latest.id if latest is not None else None
+
+    results = {}
+    try:
+        cleanup(dbenv, last_run_id)
+        with db.ssn_from_dbenv(dbenv=dbenv) as ssn:
+            user = db.User(firstname="Bench", lastname="Bench", email=f"{PREFIX}user@example.com")
+            ssn.add(user)
+            ssn.commit()
+            token = tokens.get_token(ssn=ssn, user_id=user.id)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        for scenario, cache_size in [("uncached", 0), ("cached", Config.TOKEN_CACHE_SIZE)]:
+
+            class BenchConfig(Config):
+                DBENV = dbenv
+                TOKEN_CACHE_SIZE = cache_size
+                RESPONSE_CACHE_CHECK_INTERVAL = 3600
+
+            client = create_app(BenchConfig).test_client()
+            assert client.get("/api/stats", headers=headers).status_code == 200
+            results[f"{scenario}_requests_per_sec"] = rate(
+                lambda: int(client.get("/api/stats", headers=headers).status_code == 200), seconds
+            )
+    finally:
+        cleanup(dbenv, last_run_id)
+    return results
+
+
+def synthetic_columns(n: int, seed: int = 0) -> columnar.CaseColumns:
+    """
+    Return *n* random cases in columnar form, with 1% of each field missing.
+    """
+    rng = np.random.default_rng(seed)
+    sizes = {"facility": 12, "building": 300, "department": 200}
+    arrays = {"id": np.arange(n, dtype=np.int32)}
+    for dimension, size in sizes.items():
+        arrays[dimension] = rng.integers(0, size, n).astype(np.int16)
+        arrays[dimension][rng.random(n) < 0.01] = columnar.NULL_CODE
+    for date in columnar.DATES:
+        arrays[date] = rng.integers(columnar.to_day(dt.date(2020, 3, 1)), columnar.to_day(dt.date(2023, 3, 1)), n)
+        arrays[date] = arrays[date].astype(np.int32)
+        arrays[date][rng.random(n) < 0.01] = columnar.NULL_DAY
+    dictionaries = {dimension: [f"{PREFIX}{dimension}-{i}" for i in range(size)] for dimension, size in sizes.items()}
+    return columnar.CaseColumns(**arrays, dictionaries=dictionaries)
+
+
+def bench_columnar(n: int, repeat: int = 20) -> dict[str, float]:
+    """
+    Time loading a columnar file of *n* cases and filtering it by facility and date range.
+    Reports the median of *repeat* runs.
+    """
+    path = pathlib.Path(tempfile.mkdtemp()) / "cases.ebc"
+    columnar.write(synthetic_columns(n), path)
+    load_ms, filter_ms = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        columns = columnar.load(path)
+        loaded = time.perf_counter()
+        mask = columns.mask(facility=f"{PREFIX}facility-3", start=dt.date(2021, 1, 1), end=dt.date(2021, 6, 30))
+        int(mask.sum())
+        filtered = time.perf_counter()
+        load_ms.append((loaded - start) * 1000)
+        filter_ms.append((filtered - loaded) * 1000)
+    path.unlink()
+    return {"load_ms": statistics.median(load_ms), "filter_ms": statistics.median(filter_ms)}
+
+
+def naive_analytics(rows: list[tuple[str | None, dt.date | None, dt.date | None]]) -> tuple:
+    """
+    Per-row equivalent of `bench_analytics` over `(facility, test_date, post_date)` tuples,
+    as it would be written against ORM rows.
+    """
+    daily = collections.Counter()
+    facilities = collections.Counter()
+    delays = []
+    for facility, test_date, post_date in rows:
+        facilities[facility] += 1
+        if post_date is not None:
+            daily[post_date] += 1
+            if test_date is not None and post_date >= test_date:
+                delays.append((post_date - test_date).days)
+    first, last = min(daily), max(daily)
+    counts = [daily.get(first + dt.timedelta(days=i), 0) for i in range((last - first).days + 1)]
+    means = {
+        window: [sum(counts[max(0, i - window + 1) : i + 1]) / min(i + 1, window) for i in range(len(counts))]
+        for window in [7, 14]
+    }
+    delays.sort()
+    percentiles = {p: delays[(len(delays) - 1) * p // 100] for p in [50, 90, 99]}
+    return counts, means, facilities, percentiles
+
+
+def bench_analytics(n: int) -> dict[str, float]:
+    """
+    Time daily incidence, 7- and 14-day rolling means, cases per facility and reporting
+    delay percentiles over *n* synthetic cases, vectorized and per row.
+    """
+    columns = synthetic_columns(n)
+    start = time.perf_counter()
+    series = analytics.daily_incidence(columns)
+    for window in [7, 14]:
+        analytics.rolling_mean(series.counts, window)
+    analytics.by_facility(columns)
+    analytics.reporting_delay(columns)
+    vectorized = time.perf_counter() - start
+
+    rows = list(columnar.rows(columns))
+    rows = [
+        (row["facility"], *[dt.date.fromisoformat(row[d]) if row[d] else None for d in ["test_date", "post_date"]])
+        for row in rows
+    ]
+    start = time.perf_counter()
+    naive_analytics(rows)
+    naive = time.perf_counter() - start
+    return {"vectorized_cases_per_sec": n / vectorized, "naive_cases_per_sec": n / naive}
+
+
+def run(args) -> dict[str, dict[str, float]]:
+    """
+    Run all benchmarks and return their results by name.
+    """
+    results = {
+        "sanitize": bench_sanitize(args.seconds),
+        "grep_date": bench_grep_date(args.seconds),
+        "parse_case": bench_parse_case(args.seconds),
+    }
+    for parser in ingest.PARSERS:
+        results[f"parse_html.{parser}"] = bench_parse_html(args.seconds, parser)
+
+    dbenv = args.dbenv or create_sqlite_dbenv()
+    cases = synthetic_cases(args.n)
+    results["to_db.per_row"] = bench_to_db(ingest.to_db, cases, dbenv)
+    results["to_db.bulk"] = bench_to_db(ingest.to_db_bulk, cases, dbenv)
+    results["api.token_auth"] = bench_token_auth(dbenv, args.seconds)
+    results["columnar"] = bench_columnar(COLUMNAR_ROWS)
+    results["analytics"] = bench_analytics(ANALYTICS_ROWS)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Return a message for each rate or latency in *results* that is more than *tolerance*
+    worse than in *baseline*.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(name, {}).get(metric)
+            if not old:
+                continue
+            change = (value - old) / old
+            if (metric.endswith("_per_sec") and change < -tolerance) or (metric.endswith("_ms") and change > tolerance):
+                regressions.append(f"{name} {metric}: {old:,.2f} -> {value:,.2f} ({change:+.0%})")
+    return regressions
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    args = parse_args()
+
+    # Per-case logging (including warnings for fields missing from the corpus on purpose)
+    # would dominate the timings
+    ingest.logger.setLevel(log.logging.ERROR)
+    db.logger.setLevel(log.logging.ERROR)
+
+    check_parse_case()
+    check_parsers()
+
+    results = run(args)
+    for name, metrics in results.items():
+        logger.info(f"{name}: " + ", ".join(f"{k}={v:,.2f}" for k, v in metrics.items()))
+
+    baseline_path = args.baseline
+    if baseline_path is None and RESULTS_DIR.is_dir():
+        baseline_path = max(RESULTS_DIR.glob("*.json"), default=None)
+
+    output = args.output or RESULTS_DIR / f"{dt.datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    report = {
+        "created": dt.datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "database": args.dbenv or "sqlite",
+        "results": results,
+    }
+    output.write_text(json.dumps(report, indent=2) + "\n")
+    logger.info(f"Wrote {output}")
+
+    if baseline_path is not None:
+        baseline = json.loads(baseline_path.read_text())
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for regression in regressions:
+            logger.warning(f"Regression vs {baseline_path}: {regression}")
+        if regressions:
+            sys.exit(1)
+        logger.info(f"No regressions vs {baseline_path}")
+
+
+if __name__ == "__main__":
+    main()
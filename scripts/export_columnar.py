@@ -0,0 +1,75 @@
+"""
+Export cases to a columnar file for offline analysis (see app/columnar.py), e.g.
+
+    python -m scripts.export_columnar --dbenv prod -o cases.ebc
+"""
+
+import argparse
+import pathlib
+import time
+
+import app.columnar as columnar
+import app.models as db
+import log
+
+logger = log.logging.getLogger("EBCovid.export")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-v",
+        "--verbosity",
+        help="Set logging level X (10=DEBUG, 20=INFO, 30=WARNING, 40=ERROR, 50=CRITICAL). Defaults to 20 (INFO).",
+        metavar="X",
+        type=int,
+        dest="verbosity",
+        default=20,
+    )
+    parser.add_argument(
+        "--dbenv",
+        help="Export cases from database environment X (dev, test, prod, local)",
+        metavar="X",
+        type=str,
+        dest="dbenv",
+        required=True,
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Write the file to PATH. Defaults to cases.ebc.",
+        metavar="PATH",
+        type=pathlib.Path,
+        dest="output",
+        default=pathlib.Path("cases.ebc"),
+    )
+
+    args = parser.parse_args()
+
+    if args.dbenv not in db.DBENVS:
+        parser.error(f"--dbenv must be one of {', '.join(db.DBENVS)}")
+
+    return args
+
+
+def main():
+    args = parse_args()
+
+    log.set_levels(console=args.verbosity)
+
+    start = time.perf_counter()
+    with db.ssn_from_dbenv(dbenv=args.dbenv) as ssn:
+        columns = columnar.from_db(ssn)
+    columnar.write(columns, args.output)
+    logger.info(
+        f"Wrote {len(columns)} cases to {args.output} ({args.output.stat().st_size:,} bytes) "
+        f"in {time.perf_counter() - start:.2f} s"
+    )
+
+    start = time.perf_counter()
+    columnar.load(args.output)
+    logger.info(f"Loaded {args.output} in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,45 @@
 import argparse
+import calendar
+import collections
+import concurrent.futures as cf
+import cProfile
 import datetime as dt
+import functools
+import html
+import itertools
+import pathlib
 import re
 import typing as typ
 
 import bs4
 import requests
+import sqlalchemy.orm as sa_orm
 
 import app.models as db
 import log
+from scripts import instrument
+from scripts import snapshots
 
 logger = log.logging.getLogger("EBCovid.scrape")
 
 URL = "https://eblanding.com/covid-19-case-report-summary/"
 
+# Backends accepted by `post_blocks`
+PARSERS = ["html.parser", "lxml", "fast"]
+
+# Post blocks per task when parsing in a process pool
+BLOCKS_PER_TASK = 16
+
+# Cases per transaction in `to_db_bulk`
+BATCH_SIZE = 1000
+
+# Regex for date. Matches 'Janaury 21, 1990', 'January 21 ,1990', 'Janaury 21'. Named
+# capture groups are: month=Janaury, day=21, and year=1990.
+DATE_REGEX = r"(?P<month>[a-zA-Z]+) (?P<day>\d{1,2})(?:.{1,2}(?P<year>\d{4}))?"
+
+# Lowercase month name -> month number, e.g. 'january' -> 1
+MONTHS = {name.lower(): num for num, name in enumerate(calendar.month_name) if name}
+
 
 def parse_args():
     parser = argparse.ArgumentParser()
@@ -27,46 +54,129 @@ def parse_args():
     )
     parser.add_argument(
         "--dbenv",
-        help="Insert records to database environment X (dev, test, prod)",
+        help="Insert records to database environment X (dev, test, prod, local)",
         metavar="X",
         type=str,
         dest="dbenv",
         default=None,
     )
+    parser.add_argument(
+        "--per-row",
+        help="Commit cases one at a time instead of in bulk. Slower, but tolerates databases without unique keys.",
+        action="store_true",
+        dest="per_row",
+    )
+    parser.add_argument(
+        "--full",
+        help="Parse and submit the full case history instead of only cases newer than the last ingest run.",
+        action="store_true",
+        dest="full",
+    )
+    parser.add_argument(
+        "--parser",
+        help=f"Parse HTML with backend X ({', '.join(PARSERS)}). Defaults to html.parser.",
+        metavar="X",
+        type=str,
+        dest="parser",
+        choices=PARSERS,
+        default="html.parser",
+    )
+    parser.add_argument(
+        "--from-snapshot",
+        help="Re-ingest archived pages instead of fetching: X is a snapshot path, 'latest', or 'all' (oldest first)",
+        metavar="X",
+        type=str,
+        dest="from_snapshot",
+        default=None,
+    )
+    parser.add_argument(
+        "--workers",
+        help="Parse in a pool of N processes: whole snapshots when replaying several, post blocks otherwise",
+        metavar="N",
+        type=int,
+        dest="workers",
+        default=1,
+    )
+    parser.add_argument(
+        "--batch-size",
+        help=f"Commit cases in batches of N. Defaults to {BATCH_SIZE}.",
+        metavar="N",
+        type=int,
+        dest="batch_size",
+        default=BATCH_SIZE,
+    )
+    parser.add_argument(
+        "--summary",
+        help="Also write the JSON run summary (stage times and counters) to PATH",
+        metavar="PATH",
+        type=str,
+        dest="summary",
+        default=None,
+    )
+    parser.add_argument(
+        "--profile",
+        help="Profile the run with cProfile and write the stats to PATH (see pstats). Worker processes are not profiled.",
+        metavar="PATH",
+        type=str,
+        dest="profile",
+        default=None,
+    )
 
     args = parser.parse_args()
 
-    if args.dbenv is not None and args.dbenv not in ["dev", "test", "prod"]:
-        parser.error("--dbenv must be 'dev', 'test', or 'prod'")
+    if args.dbenv is not None and args.dbenv not in db.DBENVS:
+        parser.error(f"--dbenv must be one of {', '.join(db.DBENVS)}")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
 
     return args
 
 
-def grep(regex, s, item):
+def grep(regex: str | re.Pattern, s, item):
     m = re.search(regex, s)
     if m is None:
-        logger.warning(f'Failed to resolve {item} from "{s}"')
+        logger.warning('Failed to resolve %s from "%s"', item, s)
         return None
     else:
         return m.group(1)
 
 
-def grep_date(regex, s, item, year) -> dt.date:
-    """ """
-    # Regex for date. Matches 'Janaury 21, 1990', 'January 21 ,1990', 'Janaury 21'. Named
-    # capture groups are: month=Janaury, day=21, and year=1990.
-    date_regex = "(?P<month>[a-zA-Z]+) (?P<day>\d{1,2})(?:.{1,2}(?P<year>\d{4}))?"
-    m = re.search(regex.format(date_regex), s)
+@functools.lru_cache
+def compile_date(regex: str) -> re.Pattern:
+    """
+    Return *regex* compiled with its `{}` placeholder replaced by `DATE_REGEX`.
+    """
+    return re.compile(regex.format(DATE_REGEX))
+
+
+def to_date(month: str, day: str, year: str | int) -> dt.date:
+    """
+    Return the date for *month* (full name, any case), *day* and *year*. Same result as
+    `strptime` with `'%B %d %Y'`, but looks the month up in `MONTHS`.
+    """
+    num = MONTHS.get(month.lower())
+    if num is None:
+        # Not a month name; let strptime raise its usual error
+        return dt.datetime.strptime(f"{month} {day} {year}", "%B %d %Y").date()
+    return dt.date(int(year), num, int(day))
+
+
+def grep_date(regex: str | re.Pattern, s, item, year) -> dt.date:
+    """
+    Return the date matched by *regex* in *s*, or `None` if there is no match. *regex* is
+    either a pattern from `compile_date` or a string with a `{}` placeholder for the date.
+    *year* is used if the matched date has none.
+    """
+    if isinstance(regex, str):
+        regex = compile_date(regex)
+    m = regex.search(s)
     if m is None:
-        logger.warning(f'Failed to resolve {item} from "{s}"')
+        logger.warning('Failed to resolve %s from "%s"', item, s)
         return None
 
-    groupdict = m.groupdict()
-    month = groupdict.get("month")
-    day = groupdict.get("day")
-    year = groupdict.get("year") or year
-
-    return dt.datetime.strptime(f"{month} {day} {year}", "%B %d %Y").date()
+    return to_date(m.group("month"), m.group("day"), m.group("year") or year)
 
 
 def grep_num(regex, s, item) -> int:
@@ -89,31 +199,186 @@ def sanitize(text: str) -> str:
     return text.replace("\u00a0", " ").replace("\u2018", "'").replace("\u2019", "'")
 
 
+# Patterns for the fields of a case, compiled once at import
+NUM_RE = re.compile(r"#\s*([\d,]+).*:.*$")
+FACILITY_RE = re.compile(r":\s*Employee from ([\w\s'()]+)")
+DEPT_RE = re.compile(r"Dept.\s*([\d/]+)")
+BLDG_RE = re.compile(r"Bldg. (.+),")
+LAST_DAY_RE = compile_date(r"last day of work on {}")
+TEST_DAY_RE = compile_date(r"tested on {}\.?")
+POST_DAY_RE = compile_date(r"Posted on {}:?")
+
+
 def parse_case(text, post_day):
+    year = post_day.year
     return {
-        "id": grep_num("#\s*([\d,]+).*:.*$", text, "num"),
-        "facility": grep(":\s*Employee from ([\w\s'()]+)", text, "facility"),
-        "dept": grep("Dept.\s*([\d/]+)", text, "dept"),
-        "bldg": grep("Bldg. (.+),", text, "bldg"),
+        "id": grep_num(NUM_RE, text, "num"),
+        "facility": grep(FACILITY_RE, text, "facility"),
+        "dept": grep(DEPT_RE, text, "dept"),
+        "bldg": grep(BLDG_RE, text, "bldg"),
         "post_day": post_day,
-        "last_day": grep_date("last day of work on {}", text, "last_day", post_day.year),
-        "test_day": grep_date("tested on {}\.?", text, "test_day", post_day.year),
+        "last_day": grep_date(LAST_DAY_RE, text, "last_day", year),
+        "test_day": grep_date(TEST_DAY_RE, text, "test_day", year),
     }
 
 
-def get_soup():
+def fetch() -> bytes:
+    """
+    Return the raw HTML of https://eblanding.com/covid-19-case-report-summary/. The page is
+    also stored in the snapshot archive.
+    """
     logger.info("Getting HTML...")
-    page = requests.get(url="https://eblanding.com/covid-19-case-report-summary/")
-    soup = bs4.BeautifulSoup(page.content, "html.parser")
+    with instrument.stats.stage("fetch"):
+        page = requests.get(url=URL)
+        page.raise_for_status()
+    instrument.stats.count("bytes_fetched", len(page.content))
+    snapshots.save(html=page.content, url=URL)
     logger.info("Done.")
-    return soup
+    return page.content
 
 
-def parse_html() -> list[dict]:
+def get_soup(page: bytes | None = None, parser: str = "html.parser") -> bs4.BeautifulSoup:
+    """
+    Return *page* (fetched if `None`) parsed with BeautifulSoup *parser* (html.parser,
+    lxml). Only `<article>` subtrees are parsed; the rest of the page is skipped.
     """
-    Parse HTML from https://eblanding.com/covid-19-case-report-summary/.
+    if page is None:
+        page = fetch()
+    return bs4.BeautifulSoup(page, parser, parse_only=bs4.SoupStrainer("article"))
+
+
+def _soup_post_blocks(page: bytes, parser: str) -> list[typ.Iterator[tuple[str, list[str]]]]:
+    div = get_soup(page=page, parser=parser).find("article").find("div")
+
+    def blocks(items):
+        for item in items:
+            # Each case reported on the given day is contained in an <li> tag
+            texts = []
+            for li in item.next_sibling.next_sibling.find_all("li"):
+                # <h3> of the <li> contains the entire case text
+                h3 = li.find("h3")
+
+                if h3 is not None:
+                    texts.append(h3.get_text())
+                else:
+                    logger.warning("No case data for '%s'", li.get_text())
+            yield item.get_text(), texts
+
+    return [blocks(div.find_all("pre")), blocks(div.find_all("p"))]
+
+
+# Patterns for the "fast" backend, which tokenizes the raw HTML instead of building a DOM
+_ARTICLE_RE = re.compile(r"<article\b.*?<div\b[^>]*>(.*?)</article>", re.DOTALL | re.IGNORECASE)
+_POST_RES = [
+    re.compile(rf"<{tag}\b[^>]*>(.*?)</{tag}>(?:\s*<(ul|ol)\b[^>]*>(.*?)</\2>)?", re.DOTALL | re.IGNORECASE)
+    for tag in ["pre", "p"]
+]
+_LI_RE = re.compile(r"<li\b[^>]*>(.*?)</li>", re.DOTALL | re.IGNORECASE)
+_H3_RE = re.compile(r"<h3\b[^>]*>(.*?)</h3>", re.DOTALL | re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]*>")
+
+
+def _text(fragment: str) -> str:
+    """
+    Return the text of HTML *fragment*, like `bs4.Tag.get_text`.
+    """
+    return html.unescape(_TAG_RE.sub("", fragment))
+
+
+def _fast_post_blocks(page: bytes) -> list[typ.Iterator[tuple[str, list[str]]]]:
+    # Decode the same way BeautifulSoup does, so that all backends see the same text
+    markup = bs4.UnicodeDammit(page, is_html=True).unicode_markup
+    m = _ARTICLE_RE.search(markup)
+    article = m.group(1) if m is not None else ""
 
-    Return list of `dict`. Each `dict` is:
+    def blocks(regex):
+        for m in regex.finditer(article):
+            texts = []
+            for li in _LI_RE.findall(m.group(3) or ""):
+                h3 = _H3_RE.search(li)
+                if h3 is not None:
+                    texts.append(_text(h3.group(1)))
+                else:
+                    logger.warning("No case data for '%s'", _text(li))
+            yield _text(m.group(1)), texts
+
+    return [blocks(regex) for regex in _POST_RES]
+
+
+def post_blocks(page: bytes, parser: str = "html.parser") -> list[typ.Iterator[tuple[str, list[str]]]]:
+    """
+    Return the post blocks of *page* as two iterators, one over the `<pre>` posts and one
+    over the `<p>` posts. Each post block is a `(post_text, case_texts)` tuple, e.g.
+    `('Posted on October 17, 2020:', ['#1,003: Employee from ...', ...])`.
+
+    *parser* is one of `PARSERS`. html.parser and lxml parse the `<article>` with
+    BeautifulSoup. fast tokenizes the raw HTML with regular expressions and never builds
+    a DOM; it assumes the case list directly follows each post and is not nested.
+    """
+    if parser == "fast":
+        return _fast_post_blocks(page)
+    return _soup_post_blocks(page, parser)
+
+
+def parse_block(block: tuple[str, list[str]]) -> tuple[dt.date | None, list[dict]]:
+    """
+    Return the post date and the cases of post *block* (see `post_blocks`).
+    """
+    post_text, texts = block
+    post_day = grep_date(POST_DAY_RE, post_text, "post_day", 1990)
+    logger.debug("Getting cases for %s...", post_day)
+    cases = []
+    for text in texts:
+        logger.debug(text)
+        cases.append(parse_case(text=sanitize(text), post_day=post_day))
+    return post_day, cases
+
+
+def parse_blocks(blocks: list[tuple[str, list[str]]]) -> list[tuple[dt.date | None, list[dict]]]:
+    """
+    Return `parse_block` of each of *blocks*. This is the unit of work sent to a process
+    pool.
+    """
+    return [parse_block(block) for block in blocks]
+
+
+def imap_ordered(pool: cf.Executor, func: typ.Callable, iterable: typ.Iterable, window: int | None = None):
+    """
+    Yield `func(item)` for each item of *iterable*, computed in *pool*, in input order.
+    Unlike `Executor.map`, at most *window* (default: twice the pool's workers) calls are
+    in flight, so a long *iterable* is neither read ahead nor its results held at once.
+    """
+    window = window or 2 * getattr(pool, "_max_workers", 1)
+    pending = collections.deque()
+    for item in iterable:
+        pending.append(pool.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def iter_cases(
+    page: bytes | None = None,
+    parser: str = "html.parser",
+    since_case: int | None = None,
+    since_day: dt.date | None = None,
+    pool: cf.Executor | None = None,
+) -> typ.Iterator[dict]:
+    """
+    Parse *page* (fetched from https://eblanding.com/covid-19-case-report-summary/ if
+    `None`) with *parser* (see `post_blocks`), yielding each case as soon as its post
+    block is parsed.
+
+    If *pool* is given, the cases of the post blocks are parsed in *pool* in batches of
+    `BLOCKS_PER_TASK` blocks. Cases are still yielded in page order.
+
+    If *since_day* is given, only cases newer than the high-water mark (*since_case*,
+    *since_day*) are yielded. Posts are listed newest first, so walking the posts stops
+    at the first dated post whose cases are all old, or that is older than *since_day*.
+    Posts without a date or without cases are skipped.
+
+    Each case is a `dict`:
     ```
     {
         "id": int | None,
@@ -126,44 +391,140 @@ def parse_html() -> list[dict]:
     }
     ```
     """
+    if page is None:
+        page = fetch()
     logger.info("Parsing cases...")
-    soup = get_soup()
-    cases = []
+    n = 0
 
     # Each <pre> or <p> tag denotes a new day of case reporting
     # e.g. 'Posted on October 17, 2020:'
-    pre = soup.find("article").find("div").find_all("pre")
-    p = soup.find("article").find("div").find_all("p")
+    with instrument.stats.stage("html_parse"):
+        groups = post_blocks(page=page, parser=parser)
+    for blocks in groups:
+        blocks = instrument.stats.timed("html_parse", blocks, counter="post_blocks")
+        if pool is None:
+            parsed = map(parse_block, blocks)
+        else:
+            tasks = imap_ordered(pool, parse_blocks, batched(blocks, BLOCKS_PER_TASK))
+            parsed = itertools.chain.from_iterable(tasks)
+
+        for post_day, cases in instrument.stats.timed("case_parse", parsed):
+            if since_day is not None and post_day is not None and post_day < since_day:
+                break
+
+            new_cases = [case for case in cases if is_new(case, since_case=since_case, since_day=since_day)]
+            n += len(new_cases)
+            yield from new_cases
+            # Blocks without a date or without cases (e.g. an intro paragraph) say nothing
+            # about the posts after them
+            if since_day is not None and post_day is not None and cases and not new_cases:
+                break
+
+    logger.info(f"Done. Parsed {n} cases.")
+
+
+def parse_snapshot(path: pathlib.Path, parser: str, since_case: int | None, since_day: dt.date | None) -> list[dict]:
+    """
+    Return the cases of the snapshot at *path*, like `parse_html`.
+    """
+    return parse_html(page=snapshots.load(path), parser=parser, since_case=since_case, since_day=since_day)
 
-    for item in pre + p:
-        post_day = grep_date("Posted on {}:?", item.get_text(), "post_day", 1990)
-        logger.debug(f"Getting cases for {post_day}...")
 
-        # Each case reported on the given day is contained in an <li> tag
-        for li in item.next_sibling.next_sibling.find_all("li"):
-            # <h3> of the <li> contains the entire case text
-            h3 = li.find("h3")
+def iter_cases_many(
+    paths: typ.Iterable[pathlib.Path],
+    parser: str = "html.parser",
+    since_case: int | None = None,
+    since_day: dt.date | None = None,
+    pool: cf.Executor | None = None,
+) -> typ.Iterator[dict]:
+    """
+    Yield the cases of each snapshot in *paths* (oldest first), like `iter_cases`. The
+    high-water mark advances after each snapshot, so a case carried over from one snapshot
+    to the next is only yielded once.
 
-            if h3 is not None:
-                logger.debug(text := h3.get_text())
-                cases.append(parse_case(text=sanitize(text), post_day=post_day))
-            else:
-                logger.warning(f"No case data for '{li.get_text()}'")
+    If *pool* is given, whole snapshots are parsed in *pool* against the starting mark and
+    the advancing mark is applied here, in snapshot order.
+    """
+    mark = [since_case, since_day]
 
-    logger.info("Done.")
-    return cases
+    def serial():
+        for path in paths:
+            yield iter_cases(page=snapshots.load(path), parser=parser, since_case=mark[0], since_day=mark[1])
 
+    if pool is None:
+        pages = serial()
+    else:
+        parse = functools.partial(parse_snapshot, parser=parser, since_case=since_case, since_day=since_day)
+        pages = imap_ordered(pool, parse, paths)
+
+    for cases in instrument.stats.timed("snapshot_parse", pages):
+        page_case, page_day = mark
+        for case in cases:
+            if not is_new(case, since_case=page_case, since_day=page_day):
+                continue
+            yield case
+            if case["post_day"] is not None and (mark[1] is None or case["post_day"] > mark[1]):
+                mark[:] = [case["id"], case["post_day"]]
+            elif case["post_day"] == mark[1]:
+                mark[0] = max_or_none(mark[0], case["id"])
+
+
+def parse_html(
+    page: bytes | None = None,
+    parser: str = "html.parser",
+    since_case: int | None = None,
+    since_day: dt.date | None = None,
+) -> list[dict]:
+    """
+    Return the list of cases yielded by `iter_cases`.
+    """
+    return list(iter_cases(page=page, parser=parser, since_case=since_case, since_day=since_day))
+
+
+def batched(iterable: typ.Iterable, n: int) -> typ.Iterator[list]:
+    """
+    Yield lists of *n* consecutive items from *iterable*. The last list may be shorter.
+    Raise `ValueError` if *n* is less than 1.
+    """
+    if n < 1:
+        raise ValueError("n must be at least 1")
+    it = iter(iterable)
+    while batch := list(itertools.islice(it, n)):
+        yield batch
+
+
+def max_or_none(*values):
+    """
+    Return the largest of *values* that is not `None`, or `None` if there is none.
+    """
+    return max((value for value in values if value is not None), default=None)
+
+
+def is_new(case: dict[str, typ.Any], since_case: int | None, since_day: dt.date | None) -> bool:
+    """
+    Return `True` if *case* is newer than the high-water mark (*since_case*, *since_day*).
+    Cases without a post date or case number cannot be placed and count as new.
+    """
+    if since_day is None or case["post_day"] is None or case["post_day"] > since_day:
+        return True
+    if case["post_day"] < since_day:
+        return False
+    return since_case is None or case["id"] is None or case["id"] > since_case
 
-def parse_html2():
-    soup = get_soup()
-    cases = []
-    for text in re.findall("#.*", soup.get_text()):
-        # TODO: Posted date is garbage using this method
-        cases.append(parse_case(text=text, post_day=dt.date(1900, 1, 1)))
-    return cases
 
+def record_high_water(ssn: sa_orm.Session, case_num: int | None, post_date: dt.date | None) -> None:
+    """
+    Add an `IngestRun` holding the higher of *case_num* and *post_date* and those of the
+    previous run. Does not commit.
+    """
+    latest = db.IngestRun.latest(ssn)
+    if latest is not None:
+        case_num = max_or_none(case_num, latest.case_num)
+        post_date = max_or_none(post_date, latest.post_date)
+    ssn.add(db.IngestRun(case_num=case_num, post_date=post_date))
 
-def distinct(cases: list[dict], key: str) -> None:
+
+def distinct(cases: list[dict], key: str) -> list:
     """
     Return a sorted list of distinct values of *key*. Discards `None` if it is a value.
     """
@@ -172,39 +533,169 @@ def distinct(cases: list[dict], key: str) -> None:
     return sorted(list(set_))
 
 
-def to_db(cases: list[dict[str, typ.Any]], dbenv: str):
+def to_db(cases: typ.Iterable[dict[str, typ.Any]], dbenv: str):
     """
-    Add cases from *cases* to database denoted by environment *dbenv* (dev, test, prod).
+    Add cases from *cases* to database denoted by environment *dbenv* (dev, test, prod,
+    local). Facility spellings are normalized with `db.FacilityNormalizer`. Existing cases
+    are found by their case number, or by their `db.CovidCase.hash_content` if they have
+    none. Stored cases without a case number are numbered by the first case with their
+    fields (see `db.CovidCase.claim_unnumbered`). `db.DailyCount` is refreshed for the post
+    dates of *cases*.
     """
     logger.info("Committing cases to database...")
     with db.ssn_from_dbenv(dbenv=dbenv) as ssn:
+        dims = db.DimensionCache.for_session(ssn)
+        facilities = db.FacilityNormalizer.for_session(ssn)
+        case_num = post_date = None
+        post_dates = set()
+        i = 0
         for i, case in enumerate(cases, start=1):
-            logger.debug(f"Committing data for case {case['id']} ({i} of {len(cases)})...")
-            facility = db.Facility.one_or_create(ssn=ssn, name=case["facility"])
-            dept = db.Department.one_or_create(ssn=ssn, name=case["dept"])
-            bldg = db.Building.one_or_create(ssn=ssn, name=case["bldg"])
-            db.CovidCase.one_or_create(
-                ssn=ssn,
-                facility_id=facility.id,
-                building_id=bldg.id,
-                department_id=dept.id,
-                last_work_date=case["last_day"],
-                test_date=case["test_day"],
-                post_date=case["post_day"],
-            )
+            logger.debug("Committing data for case %s (%s)...", case["id"], i)
+            fields = {
+                "case_num": case["id"],
+                "facility_id": facilities.resolve(ssn=ssn, name=case["facility"]),
+                "building_id": dims.id(ssn=ssn, model=db.Building, name=case["bldg"]),
+                "department_id": dims.id(ssn=ssn, model=db.Department, name=case["dept"]),
+                "last_work_date": case["last_day"],
+                "test_date": case["test_day"],
+                "post_date": case["post_day"],
+            }
+            fields["content_hash"] = db.CovidCase.hash_content(**fields)
+            if case["id"] is not None and not db.CovidCase.existing_case_nums(ssn=ssn, case_nums=[case["id"]]):
+                if db.CovidCase.claim_unnumbered(ssn=ssn, rows=[fields]):
+                    ssn.commit()
+            key = "case_num" if case["id"] is not None else "content_hash"
+            value = fields.pop(key)
+            db.CovidCase.one_or_create(ssn=ssn, defaults=fields, **{key: value})
+            case_num = max_or_none(case_num, case["id"])
+            post_date = max_or_none(post_date, case["post_day"])
+            post_dates.add(case["post_day"])
+        if i:
+            facilities.flush(ssn)
+            db.DailyCount.refresh(ssn=ssn, dates=post_dates)
+            record_high_water(ssn=ssn, case_num=case_num, post_date=post_date)
+            ssn.commit()
     logger.info("Done.")
 
 
+def to_db_bulk(cases: typ.Iterable[dict[str, typ.Any]], dbenv: str, batch_size: int = BATCH_SIZE) -> tuple[int, int]:
+    """
+    Add cases from *cases* to database denoted by environment *dbenv* (dev, test, prod,
+    local) using set-based inserts. *cases* is consumed in batches of *batch_size*, each
+    committed in its own transaction, so memory use and time to first commit do not depend
+    on the number of cases. Facility spellings are normalized with `db.FacilityNormalizer`.
+    Cases whose case number already exists are skipped by an explicit lookup, which also
+    holds if CovidCase is partitioned, and cases whose content hash already exists by the
+    unique indexes. Stored cases without a case number are numbered by the first case with
+    their fields instead of being inserted again (see `db.CovidCase.claim_unnumbered`).
+    `db.DailyCount` is refreshed for the post dates of each batch that inserted cases.
+
+    Return the number of cases inserted and the number of cases skipped.
+    """
+    logger.info("Bulk committing cases to database...")
+    inserted = skipped = 0
+    case_num = post_date = None
+    with db.ssn_from_dbenv(dbenv=dbenv) as ssn:
+        dims = db.DimensionCache.for_session(ssn)
+        facilities = db.FacilityNormalizer.for_session(ssn)
+        for batch in batched(cases, batch_size):
+            with ssn.begin():
+                facility_ids = {name: facilities.resolve(ssn=ssn, name=name) for name in distinct(batch, "facility")}
+                dept_ids = dims.ids_by_name(ssn=ssn, model=db.Department, names=distinct(batch, "dept"))
+                bldg_ids = dims.ids_by_name(ssn=ssn, model=db.Building, names=distinct(batch, "bldg"))
+                known = db.CovidCase.existing_case_nums(ssn=ssn, case_nums=distinct(batch, "id"))
+                rows = []
+                for case in batch:
+                    if case["id"] in known:
+                        continue
+                    if case["id"] is not None:
+                        known.add(case["id"])
+                    fields = {
+                        "case_num": case["id"],
+                        "facility_id": facility_ids.get(case["facility"]),
+                        "building_id": bldg_ids.get(case["bldg"]),
+                        "department_id": dept_ids.get(case["dept"]),
+                        "last_work_date": case["last_day"],
+                        "test_date": case["test_day"],
+                        "post_date": case["post_day"],
+                    }
+                    rows.append({"content_hash": db.CovidCase.hash_content(**fields), **fields})
+                claimed = db.CovidCase.claim_unnumbered(ssn=ssn, rows=rows)
+                rows = [row for row in rows if row["case_num"] not in claimed]
+                n = len(db.CovidCase.insert_many(ssn=ssn, rows=rows))
+                facilities.flush(ssn)
+                if n:
+                    db.DailyCount.refresh(ssn=ssn, dates=distinct(batch, "post_day"))
+            inserted += n
+            skipped += len(batch) - n
+            case_num = max_or_none(case_num, *[case["id"] for case in batch])
+            post_date = max_or_none(post_date, *[case["post_day"] for case in batch])
+            logger.info(f"Committed batch of {len(batch)} cases ({inserted + skipped} so far)")
+        if inserted or skipped:
+            with ssn.begin():
+                record_high_water(ssn=ssn, case_num=case_num, post_date=post_date)
+    logger.info(f"Done. Inserted {inserted} cases, skipped {skipped} existing cases.")
+    return inserted, skipped
+
+
+def run(args):
+    """
+    Ingest as directed by *args* (see `parse_args`). Stage times and counters are logged as
+    a JSON summary at the end of the run, whether or not it succeeds.
+    """
+    instrument.stats = instrument.RunStats()
+    since_case = since_day = None
+    if args.dbenv is not None and not args.full:
+        with db.ssn_from_dbenv(dbenv=args.dbenv) as ssn:
+            latest = db.IngestRun.latest(ssn)
+        if latest is not None:
+            since_case, since_day = latest.case_num, latest.post_date
+            logger.info(f"Ingesting cases newer than #{since_case} posted on {since_day}")
+
+    if args.dbenv is not None:
+        instrument.stats.watch(db.engines.engine(args.dbenv))
+    pool = cf.ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+    try:
+        # Cases are streamed from the parser into the database, so they are only collected
+        # into a list when there is no database to write to
+        paths = [] if args.from_snapshot is None else snapshots.resolve(args.from_snapshot)
+        if len(paths) > 1:
+            logger.info(f"Replaying {len(paths)} snapshots")
+            cases = iter_cases_many(paths, parser=args.parser, since_case=since_case, since_day=since_day, pool=pool)
+        else:
+            if paths:
+                with instrument.stats.stage("snapshot_load"):
+                    page = snapshots.load(paths[0])
+            else:
+                page = fetch()
+            cases = iter_cases(page=page, parser=args.parser, since_case=since_case, since_day=since_day, pool=pool)
+        cases = instrument.count_misses(cases)
+        if args.dbenv is None:
+            return list(cases)
+        with instrument.stats.stage("db"):
+            if args.per_row:
+                to_db(cases, args.dbenv)
+            else:
+                to_db_bulk(cases, args.dbenv, batch_size=args.batch_size)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        instrument.stats.emit(path=args.summary)
+
+
 def main():
     args = parse_args()
 
-    log.ch.setLevel(args.verbosity)
+    log.set_levels(console=args.verbosity)
 
-    cases = parse_html()
-    # TODO: Coerce facilities to proper format
-    if args.dbenv is not None:
-        to_db(cases, args.dbenv)
-    return cases
+    if args.profile is None:
+        return run(args)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(run, args)
+    finally:
+        profiler.dump_stats(args.profile)
+        logger.info(f"Wrote profile to {args.profile}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,106 @@
+"""
+Stage timers and counters for ingest runs.
+"""
+
+import collections
+import contextlib
+import json
+import time
+import typing as typ
+
+import sqlalchemy as sa
+
+import log
+
+logger = log.logging.getLogger("EBCovid.instrument")
+
+T = typ.TypeVar("T")
+
+
+class RunStats:
+    """
+    Wall-clock time per stage and event counters of one run.
+
+    Stage times are exclusive: while a stage is nested in another, its time is not also
+    counted towards the outer stage, so the stage times add up to at most the run time.
+    Generators are timed with `timed`, which only counts the time spent producing items.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timers: collections.Counter[str] = collections.Counter()
+        self.counters: collections.Counter[str] = collections.Counter()
+        self._stack: list[list] = []  # [name, start, time in nested stages]
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> typ.Iterator[None]:
+        frame = [name, time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[1]
+            self.timers[name] += elapsed - frame[2]
+            if self._stack:
+                self._stack[-1][2] += elapsed
+
+    def timed(self, name: str, iterable: typ.Iterable[T], counter: str | None = None) -> typ.Iterator[T]:
+        """
+        Yield the items of *iterable*, counting the time spent getting each item towards
+        stage *name*, and the items towards *counter* if given.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            if counter is not None:
+                self.counters[counter] += 1
+            yield item
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    def watch(self, engine: sa.Engine) -> None:
+        """
+        Count the statements sent (database round trips) and the commits of *engine*.
+        """
+        sa.event.listen(engine, "before_cursor_execute", lambda *args: self.count("db_round_trips"))
+        sa.event.listen(engine, "commit", lambda conn: self.count("db_commits"))
+
+    def summary(self) -> dict[str, typ.Any]:
+        return {
+            "elapsed_s": round(time.perf_counter() - self.started, 6),
+            "stages_s": {name: round(seconds, 6) for name, seconds in self.timers.items()},
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def emit(self, path: str | None = None) -> None:
+        """
+        Log the summary as one line of JSON, and write it to *path* if given.
+        """
+        summary = json.dumps(self.summary())
+        logger.info("Run summary: %s", summary)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(summary + "\n")
+
+
+# Stats of the current run
+stats = RunStats()
+
+
+def count_misses(cases: typ.Iterable[dict]) -> typ.Iterator[dict]:
+    """
+    Yield *cases*, counting them and, per field, the cases in which the field could not
+    be parsed.
+    """
+    for case in cases:
+        stats.count("cases")
+        for key, value in case.items():
+            if value is None:
+                stats.count(f"regex_misses.{key}")
+        yield case
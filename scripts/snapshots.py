@@ -0,0 +1,91 @@
+"""
+Content-addressed archive of fetched case report pages.
+
+Each distinct page is stored once as `<sha256>.html.gz` in `Config.SNAPSHOT_DIR`. Every
+fetch, including repeats of unchanged content, appends a line to `index.jsonl`:
+```
+{"sha256": "...", "fetched_at": "2023-07-16T08:00:00", "url": "...", "size": 1234}
+```
+"""
+
+import datetime as dt
+import gzip
+import hashlib
+import json
+import pathlib
+
+import log
+from config import Config
+
+logger = log.logging.getLogger("EBCovid.snapshots")
+
+INDEX = "index.jsonl"
+SUFFIX = ".html.gz"
+
+
+def archive_dir() -> pathlib.Path:
+    return pathlib.Path(Config.SNAPSHOT_DIR)
+
+
+def save(html: bytes, url: str, fetched_at: dt.datetime | None = None) -> pathlib.Path:
+    """
+    Store *html* fetched from *url* at *fetched_at* (defaults to now) in the archive and
+    return the path of its snapshot. Content that is already archived is not written again.
+    """
+    digest = hashlib.sha256(html).hexdigest()
+    path = archive_dir() / f"{digest}{SUFFIX}"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if not path.exists():
+        # Write to a temporary file first so that a crash never leaves a truncated snapshot
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(gzip.compress(html, compresslevel=6))
+        tmp.replace(path)
+        logger.info(f"Archived snapshot {path.name} ({len(html):,} bytes)")
+    entry = {
+        "sha256": digest,
+        "fetched_at": (fetched_at or dt.datetime.now()).isoformat(timespec="seconds"),
+        "url": url,
+        "size": len(html),
+    }
+    with open(archive_dir() / INDEX, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    return path
+
+
+def load(path: pathlib.Path | str) -> bytes:
+    """
+    Return the HTML of the snapshot at *path*. Plain (uncompressed) HTML files are accepted
+    too.
+    """
+    path = pathlib.Path(path)
+    data = path.read_bytes()
+    return gzip.decompress(data) if path.suffix == ".gz" else data
+
+
+def index() -> list[dict]:
+    """
+    Return the archive index entries in fetch order.
+    """
+    try:
+        with open(archive_dir() / INDEX, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def resolve(spec: str) -> list[pathlib.Path]:
+    """
+    Return the snapshot paths selected by *spec*:
+     * `latest`: the most recently fetched snapshot
+     * `all`: every distinct snapshot, oldest fetch first
+     * anything else: a path to a snapshot or HTML file
+    """
+    if spec not in ["latest", "all"]:
+        return [pathlib.Path(spec)]
+
+    digests = list(dict.fromkeys(entry["sha256"] for entry in index()))
+    if not digests:
+        raise FileNotFoundError(f"No snapshots in {archive_dir()}")
+    if spec == "latest":
+        digests = [index()[-1]["sha256"]]
+    return [archive_dir() / f"{digest}{SUFFIX}" for digest in digests]
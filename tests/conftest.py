@@ -0,0 +1,37 @@
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm as sa_orm
+
+import app.models as db
+from config import Config
+from tests.fixtures import load_page
+
+
+@pytest.fixture(scope="session")
+def page() -> bytes:
+    """
+    The bundled copy of the case report page.
+    """
+    return load_page()
+
+
+@pytest.fixture
+def ssn() -> sa_orm.Session:
+    """
+    A session of a new in-memory SQLite database with the tables of `db.Metadata`.
+    """
+    engine = sa.create_engine("sqlite://")
+    db.Metadata.create_all(engine)
+    with sa_orm.Session(engine) as ssn:
+        yield ssn
+    engine.dispose()
+
+
+@pytest.fixture
+def local(tmp_path) -> str:
+    """
+    The "local" dbenv, backed by a new SQLite file.
+    """
+    db.engines.register("local", f"sqlite:///{tmp_path / 'local.db'}")
+    yield "local"
+    db.engines.register("local", Config.DB_URI_LOCAL)
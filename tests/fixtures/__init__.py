@@ -0,0 +1,30 @@
+"""
+Bundled fixtures: a copy of the case report page and a regression corpus of case texts.
+Shared by the tests and `scripts.bench`, so it only depends on the standard library.
+"""
+
+import datetime as dt
+import json
+import pathlib
+import typing as typ
+
+FIXTURES = pathlib.Path(__file__).parent
+
+
+def load_corpus() -> list[tuple[str, dt.date, dict[str, typ.Any]]]:
+    """
+    Return the regression corpus of case texts as `(text, post_day, expected)` tuples,
+    where *expected* is the output of `scripts.ingest.parse_case`.
+    """
+    corpus = []
+    for entry in json.loads((FIXTURES / "cases.json").read_text(encoding="utf-8")):
+        expected = entry["expected"]
+        for key in ["post_day", "last_day", "test_day"]:
+            if expected[key] is not None:
+                expected[key] = dt.date.fromisoformat(expected[key])
+        corpus.append((entry["text"], dt.date.fromisoformat(entry["post_day"]), expected))
+    return corpus
+
+
+def load_page() -> bytes:
+    return (FIXTURES / "page.html").read_bytes()
@@ -0,0 +1,30 @@
+"""`app.models.DimensionCache`."""
+
+import time
+import types
+
+import app.models as db
+
+
+def test_ids_by_name_inserts_missing_names(ssn):
+    cache = db.DimensionCache()
+    ids = cache.ids_by_name(ssn=ssn, model=db.Building, names=["197", "260", None])
+    assert set(ids) == {"197", "260"}
+    assert cache.get(ssn=ssn, model=db.Building, name="197") == ids["197"]
+    assert cache.get(ssn=ssn, model=db.Building, name="A") is None
+
+
+def test_clear_while_loading(ssn, monkeypatch):
+    # Another thread clears the cache while this one is (re)loading a table
+    cache = db.DimensionCache(max_age=300)
+    cache.id(ssn=ssn, model=db.Department, name="9/21")
+
+    def monotonic():
+        cache.clear()
+        return time.monotonic()
+
+    monkeypatch.setattr(db, "time", types.SimpleNamespace(monotonic=monotonic))
+    cache.clear()
+    assert cache.get(ssn=ssn, model=db.Department, name="9/21") is not None
+    monkeypatch.undo()
+    assert cache.get(ssn=ssn, model=db.Department, name="9/21") is not None
@@ -0,0 +1,22 @@
+"""Command line validation of `scripts.ingest`."""
+
+import sys
+
+import pytest
+
+from scripts import ingest
+
+
+@pytest.mark.parametrize("option", ["--batch-size", "--workers"])
+@pytest.mark.parametrize("value", ["0", "-1"])
+def test_rejects_counts_below_one(monkeypatch, capsys, option, value):
+    monkeypatch.setattr(sys, "argv", ["ingest.py", option, value])
+    with pytest.raises(SystemExit) as exc_info:
+        ingest.parse_args()
+    assert exc_info.value.code == 2
+    assert f"{option} must be at least 1" in capsys.readouterr().err
+
+
+def test_batched_rejects_sizes_below_one():
+    with pytest.raises(ValueError):
+        list(ingest.batched([1, 2], 0))
@@ -0,0 +1,49 @@
+"""`scripts.ingest.to_db` and `to_db_bulk` on the local SQLite environment."""
+
+import pytest
+import sqlalchemy as sa
+
+import app.models as db
+from scripts import ingest
+
+# Cases of the bundled page: 268 with distinct case numbers, 22 distinct without one
+STORED = (290, 268)
+
+
+@pytest.fixture
+def cases(page) -> list[dict]:
+    return ingest.parse_html(page=page, parser="fast")
+
+
+def stored(dbenv: str) -> tuple[int, int]:
+    """
+    Return the number of stored cases and of those with a case number, after checking
+    that each is stored with its `db.CovidCase.hash_content`.
+    """
+    with db.ssn_from_dbenv(dbenv) as ssn:
+        rows = ssn.scalars(sa.select(db.CovidCase)).all()
+    for row in rows:
+        fields = [row.facility_id, row.building_id, row.department_id, row.last_work_date, row.test_date, row.post_date]
+        assert row.content_hash == db.CovidCase.hash_content(row.case_num, *fields)
+    return len(rows), sum(row.case_num is not None for row in rows)
+
+
+@pytest.mark.parametrize("to_db", [ingest.to_db_bulk, ingest.to_db])
+def test_reingest_is_idempotent(local, cases, to_db):
+    to_db(iter(cases), local)
+    assert stored(local) == STORED
+    to_db(iter(cases), local)
+    assert stored(local) == STORED
+
+
+@pytest.mark.parametrize("to_db", [ingest.to_db_bulk, ingest.to_db])
+def test_reingest_numbers_cases_stored_without_numbers(local, cases, to_db):
+    # Cases stored before the upgrade to case numbers, which the backfill of migration
+    # 6c2e8f1b4d07 hashed without one. Cases with the same fields collapsed into one.
+    ingest.to_db_bulk(iter([dict(case, id=None) for case in cases]), local)
+    assert stored(local) == (281, 0)
+
+    to_db(iter(cases), local)
+    assert stored(local) == STORED
+    to_db(iter(cases), local)
+    assert stored(local) == STORED
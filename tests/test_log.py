@@ -0,0 +1,15 @@
+"""Queued logging of `log`."""
+
+import logging
+
+import log
+
+
+def test_prepare_merges_arguments():
+    # Arguments, e.g. ORM objects, must not reach the listener thread
+    record = logging.LogRecord("EBCovid.test", logging.INFO, __file__, 1, "Created %s", (object(),), None)
+    prepared = log.qh.prepare(record)
+    assert prepared.args is None
+    assert prepared.getMessage() == record.getMessage()
+    assert prepared.getMessage().startswith("Created <object object")
+    assert record.args is not None
@@ -0,0 +1,13 @@
+"""`scripts.ingest.parse_case` against the regression corpus of case texts."""
+
+import pytest
+
+from scripts import ingest
+from tests.fixtures import load_corpus
+
+CORPUS = load_corpus()
+
+
+@pytest.mark.parametrize("text, post_day, expected", CORPUS, ids=[text[:24] for text, _, _ in CORPUS])
+def test_parse_case(text, post_day, expected):
+    assert ingest.parse_case(text=ingest.sanitize(text), post_day=post_day) == expected
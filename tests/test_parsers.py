@@ -0,0 +1,22 @@
+"""Parser backends of `scripts.ingest` on the bundled page."""
+
+import datetime as dt
+
+import pytest
+
+from scripts import ingest
+
+
+@pytest.mark.parametrize("parser", ingest.PARSERS[1:])
+def test_backends_agree(page, parser):
+    assert ingest.parse_html(page=page, parser=parser) == ingest.parse_html(page=page, parser=ingest.PARSERS[0])
+
+
+@pytest.mark.parametrize("parser", ingest.PARSERS)
+def test_incremental_skips_blocks_without_cases(page, parser):
+    intro = page.replace(b"<p><strong>Posted on", b"<p>Updated daily.</p>\n<p><strong>Posted on", 1)
+    assert intro != page
+    since = {"since_case": 2990, "since_day": dt.date(2021, 3, 21)}
+    expected = ingest.parse_html(page=page, parser=parser, **since)
+    assert len(expected) == 14
+    assert ingest.parse_html(page=intro, parser=parser, **since) == expected
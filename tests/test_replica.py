@@ -0,0 +1,78 @@
+"""Read replica routing of `app.models.ssn_from_dbenv`, with two SQLite files as stand-ins."""
+
+import time
+import types
+
+import pytest
+import sqlalchemy as sa
+
+import app.models as db
+from config import Config
+
+
+@pytest.fixture
+def clock(monkeypatch) -> list[float]:
+    """
+    The time seen by `db.EngineRegistry`, as a one-item list that tests advance.
+    """
+    now = [1000.0]
+    monkeypatch.setattr(db, "time", types.SimpleNamespace(monotonic=lambda: now[0], perf_counter=time.perf_counter))
+    return now
+
+
+@pytest.fixture
+def dbenv(tmp_path, request, clock) -> str:
+    """
+    A dbenv whose primary is `primary.db` and whose replica is `replica.db` in *tmp_path*.
+    """
+    dbenv = f"replica-{request.node.name}"
+    db.register_dbenv(dbenv, f"sqlite:///{tmp_path / 'primary.db'}", replica_url=f"sqlite:///{tmp_path / 'replica.db'}")
+    yield dbenv
+    for key, engine in db.engines.created().items():
+        if key in [dbenv, dbenv + db.REPLICA]:
+            engine.dispose()
+
+
+def database(ssn) -> str:
+    return ssn.get_bind().url.database.rsplit("/", 1)[-1]
+
+
+def test_reads_go_to_the_replica(dbenv):
+    with db.ssn_from_dbenv(dbenv, readonly=True) as ssn:
+        assert database(ssn) == "replica.db"
+    with db.ssn_from_dbenv(dbenv) as ssn:
+        assert database(ssn) == "primary.db"
+
+
+def test_reads_stick_to_the_primary_after_a_write(dbenv, clock):
+    with db.ssn_from_dbenv(dbenv) as ssn:
+        ssn.add(db.Building(name="197"))
+        ssn.commit()
+
+    clock[0] += Config.REPLICA_STICKY_SECONDS - 0.1
+    with db.ssn_from_dbenv(dbenv, readonly=True) as ssn:
+        assert database(ssn) == "primary.db"
+        assert ssn.scalar(sa.select(db.Building.id).where(db.Building.name == "197")) is not None
+
+    clock[0] += 0.1
+    with db.ssn_from_dbenv(dbenv, readonly=True) as ssn:
+        assert database(ssn) == "replica.db"
+
+
+def test_bulk_writes_are_tracked(dbenv):
+    with db.ssn_from_dbenv(dbenv) as ssn:
+        ssn.execute(sa.insert(db.Building), [{"name": "197"}, {"name": "260"}])
+        ssn.commit()
+    with db.ssn_from_dbenv(dbenv, readonly=True) as ssn:
+        assert database(ssn) == "primary.db"
+
+
+def test_sessions_without_writes_do_not_stick(dbenv):
+    with db.ssn_from_dbenv(dbenv) as ssn:
+        ssn.scalars(sa.select(db.Building)).all()
+        ssn.commit()
+    with db.ssn_from_dbenv(dbenv) as ssn:
+        ssn.add(db.Building(name="197"))
+        ssn.rollback()
+    with db.ssn_from_dbenv(dbenv, readonly=True) as ssn:
+        assert database(ssn) == "replica.db"
@@ -0,0 +1,44 @@
+"""Reference rows of `app.seed` and the SQLite databases seeded with them."""
+
+import importlib
+import types
+
+import pytest
+import sqlalchemy as sa
+
+import app.models as db
+from app import seed
+from scripts import ingest
+
+
+def migration_rows(monkeypatch) -> dict[str, list[dict]]:
+    """
+    Return the rows inserted by migration 075f96603553, by table.
+    """
+    migration = importlib.import_module("migrations.versions.075f96603553_add_table_rawfacility")
+    rows = {}
+
+    def execute(stmt):
+        rows[stmt.table.name] = [{column.key: value for column, value in row.items()} for row in stmt._multi_values[0]]
+
+    monkeypatch.setattr(migration, "op", types.SimpleNamespace(execute=execute))
+    migration._insert_facility()
+    migration._insert_rawfacility()
+    return rows
+
+
+def test_seed_matches_migration(monkeypatch):
+    rows = migration_rows(monkeypatch)
+    assert rows["Facility"] == [{"id": id_, "name": name} for id_, name in seed.FACILITIES]
+    assert rows["RawFacility"] == [
+        {"id": id_, "name": name, "facility_id": facility_id} for id_, name, facility_id in seed.RAW_FACILITIES
+    ]
+
+
+def test_ingest_uses_seeded_facilities(local, page):
+    ingest.to_db_bulk(iter(ingest.parse_html(page=page, parser="fast")), local)
+    with db.ssn_from_dbenv(local) as ssn:
+        facilities = dict(ssn.execute(sa.select(db.Facility.name, db.Facility.id)).all())
+        groton = ssn.scalar(sa.select(db.RawFacility.facility_id).where(db.RawFacility.name == "Groton facility"))
+    assert len(facilities) == len(seed.FACILITIES)
+    assert groton == facilities["Groton"]